@@ -1,13 +1,25 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from app.tasks.site_checker import start_background_checker, run_check_cycle
+from app.tasks.scheduler import site_scheduler
+from app.db.writer import result_writer
+from app.tasks import retention
+from app.tasks.status_board import status_board
+from app.ws.manager import ws_manager
+from app.nats.client import publisher
+from app.config import settings
+from app import log
+from app.tasks import remote
+from app.tasks.dns_cache import dns_cache
+from app.tasks.icmp import pinger
+from app.tasks.process_pool import process_executor
 
 router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
 
 
 @router.post("/run-check")
 async def run_single_check():
-    await run_check_cycle()
-    return {"message": "Одиночная проверка выполнена"}
+    stats = await run_check_cycle()
+    return {"message": "Одиночная проверка выполнена", "cycle": stats}
 
 
 @router.post("/start-background")
@@ -16,10 +28,35 @@ async def start_background_monitoring():
     return {"message": msg}
 
 
+@router.post("/run-retention")
+async def run_retention_now():
+    stats = await retention.run_retention()
+    return {"message": "Очистка истории выполнена", "retention": stats}
+
+
+@router.get("/board")
+async def get_status_board():
+    # Текущее состояние всех сайтов из памяти, без обращения к БД
+    return Response(content=status_board.body(), media_type="application/json")
+
+
 @router.get("/status")
 async def get_monitoring_status():
     return {
         "status": "active",
         "description": "Система мониторинга веб-сайтов",
-        "check_interval": "60 секунд"
+        "check_interval": "индивидуальный для каждого сайта",
+        "scheduler": site_scheduler.stats(),
+        "writer": result_writer.stats(),
+        "retention": retention.last_run,
+        "websocket": ws_manager.stats(),
+        "nats": publisher.stats(),
+        "dns_cache": dns_cache.stats(),
+        "icmp": pinger.stats(),
+        "logging": log.stats(),
+        "executor": {
+            "mode": settings.check_executor,
+            "nats": remote.job_dispatcher.stats,
+            "processes": process_executor.status(),
+        },
     }
\ No newline at end of file
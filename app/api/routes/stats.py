@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from app.db.session import get_db
+from app.db.archive import archive_available, read_uptime
+from app.db.history import to_utc
+from app.db.rollups import bucket_start, summarize, window_resolution
+from app.models.website import Website
+from app.models.rollup import CheckRollup
+from app.tasks.site_checker import probe_policy
+
+router = APIRouter(prefix="/stats", tags=["Stats"])
+
+WINDOWS = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+WINDOW_PATTERN = "^(1h|24h|7d|30d)$"
+
+
+def _window_bounds(window: str) -> tuple[int, datetime]:
+    # Окно читается из агрегатов фиксированного разрешения,
+    # поэтому число строк не зависит от объёма истории
+    span = WINDOWS[window]
+    resolution = window_resolution(span)
+    return resolution, bucket_start(datetime.utcnow() - span, resolution)
+
+
+@router.get("/websites/{website_id}")
+async def get_website_stats(
+    website_id: int,
+    window: str = Query("24h", pattern=WINDOW_PATTERN),
+    db: AsyncSession = Depends(get_db),
+):
+    website = await db.get(Website, website_id)
+    if not website:
+        raise HTTPException(status_code=404, detail="Website not found")
+
+    resolution, since = _window_bounds(window)
+    result = await db.execute(
+        select(CheckRollup)
+        .where(CheckRollup.website_id == website_id)
+        .where(CheckRollup.resolution == resolution)
+        .where(CheckRollup.bucket_start >= since)
+    )
+    return {
+        "website_id": website_id,
+        "website_name": website.name,
+        "window": window,
+        "resolution_seconds": resolution,
+        **summarize(result.scalars().all()),
+        "probe": probe_policy.describe(website),
+    }
+
+
+@router.get("/websites/{website_id}/archive")
+async def get_website_archive_stats(
+    website_id: int,
+    since: Optional[datetime] = Query(None, description="По умолчанию — 90 дней назад"),
+    until: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # Долгие отчёты по доступности читаются из Parquet-архива, а не из рабочей базы
+    if not archive_available():
+        raise HTTPException(status_code=501, detail="Archive is disabled (ARCHIVE_ENABLED=1 and pyarrow required)")
+    website = await db.get(Website, website_id)
+    if not website:
+        raise HTTPException(status_code=404, detail="Website not found")
+
+    until = to_utc(until) or datetime.utcnow()
+    since = to_utc(since) or until - timedelta(days=90)
+    report = await asyncio.to_thread(read_uptime, website_id, since, until)
+    return {
+        "website_id": website_id,
+        "website_name": website.name,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        **report,
+    }
+
+
+@router.get("/overview")
+async def get_stats_overview(
+    window: str = Query("24h", pattern=WINDOW_PATTERN),
+    db: AsyncSession = Depends(get_db),
+):
+    # Сводка по всем сайтам; перцентили — в статистике отдельного сайта
+    resolution, since = _window_bounds(window)
+    result = await db.execute(
+        select(
+            CheckRollup.website_id,
+            func.sum(CheckRollup.count),
+            func.sum(CheckRollup.up_count),
+            func.sum(CheckRollup.incidents),
+            func.sum(CheckRollup.latency_sum),
+            func.sum(CheckRollup.latency_count),
+            func.max(CheckRollup.latency_max),
+        )
+        .where(CheckRollup.resolution == resolution)
+        .where(CheckRollup.bucket_start >= since)
+        .group_by(CheckRollup.website_id)
+    )
+
+    sites = []
+    for website_id, count, up_count, incidents, latency_sum, latency_count, latency_max in result.all():
+        sites.append({
+            "website_id": website_id,
+            "checks": count,
+            "uptime_pct": round(up_count * 100 / count, 3) if count else None,
+            "incidents": incidents,
+            # Среднее по проверкам с измеренной задержкой, а не по всем успешным
+            "latency_avg": round(latency_sum / latency_count, 2) if latency_count else None,
+            "latency_max": round(latency_max, 2) if latency_max is not None else None,
+        })
+    return {
+        "window": window,
+        "resolution_seconds": resolution,
+        "probe_policy": probe_policy.stats(),
+        "websites": sites,
+    }
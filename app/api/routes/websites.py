@@ -1,27 +1,240 @@
+import csv
+import io
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from app.db.session import get_db
-from app.models.website import Website, WebsiteCreate, WebsiteUpdate
+from app.config import settings
+from app.db.session import AsyncSessionLocal, get_db
+from app.db.history import decode_cursor, encode_cursor, export_csv, export_ndjson, history_query, iter_history
+from app.models.website import Website, WebsiteBulkUpdate, WebsiteCreate, WebsiteIds, WebsiteUpdate
 from app.models.check_result import CheckResult
+from app.serialization import FastJSONResponse, loads
 
 from app.nats.client import publish_event
 from app.ws.manager import ws_manager
+from app.tasks.scheduler import site_scheduler
+from app.tasks.site_checker import probe_policy
+from app.tasks.status_board import status_board
+from app.tasks.transitions import transition_tracker
 
 router = APIRouter(prefix="/websites", tags=["Websites"])
 
+# Пачка для IN (...) и вставки: меньше лимита переменных SQLite
+BULK_CHUNK = 500
+WEBSITE_COLUMNS = [column.name for column in Website.__table__.columns]
+
+
+def _chunks(items: list, size: int = BULK_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _parse_bulk_body(body: bytes, content_type: str) -> list[dict]:
+    # JSON-массив, NDJSON или CSV с заголовком (name,url,protocol,...)
+    text = body.decode("utf-8-sig")
+    if "csv" in content_type:
+        return [
+            {key: value for key, value in row.items() if value not in (None, "")}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    if "ndjson" in content_type:
+        return [loads(line) for line in text.splitlines() if line.strip()]
+    items = loads(text)
+    if not isinstance(items, list):
+        raise ValueError("expected a JSON array")
+    return items
+
+
+async def _url_conflicts(db: AsyncSession, requested: dict[int, str]) -> list[dict]:
+    # Новые URL, занятые другими сайтами или другим сайтом из этого же запроса
+    conflicts, owners = [], {}
+    for website_id, url in requested.items():
+        if url in owners:
+            conflicts.append({"id": website_id, "url": url, "existing_id": owners[url]})
+        else:
+            owners[url] = website_id
+    for urls in _chunks(list(owners)):
+        result = await db.execute(select(Website.id, Website.url).where(Website.url.in_(urls)))
+        for existing_id, url in result.all():
+            if existing_id != owners[url]:
+                conflicts.append({"id": owners[url], "url": url, "existing_id": existing_id})
+    return conflicts
+
+
+def _is_url_conflict(error: IntegrityError) -> bool:
+    # Нарушение уникального индекса ix_website_url, а не другого ограничения
+    return "website.url" in str(error.orig)
+
+
+async def _notify_bulk(event_type: str, payload: dict) -> None:
+    # Одно событие на всю пачку вместо события на каждый сайт
+    event = {"type": event_type, "payload": payload}
+    await publish_event(event) or await ws_manager.broadcast_json(event)
+
 
 @router.get("/", response_model=List[Website])
 async def list_websites(
     is_active: Optional[bool] = Query(default=None),
     db: AsyncSession = Depends(get_db),
 ):
-    stmt = select(Website)
+    # Строки из базы отдаются как есть: без ORM-объектов и повторной
+    # валидации через response_model (он остаётся для схемы OpenAPI)
+    stmt = select(*Website.__table__.columns)
     if is_active is not None:
         stmt = stmt.where(Website.is_active == is_active)
     result = await db.execute(stmt.order_by(Website.id))
-    return result.scalars().all()
+    return FastJSONResponse([dict(row) for row in result.mappings()])
+
+
+@router.post("/bulk", status_code=201)
+async def create_websites_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    try:
+        items = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot parse body: {e}")
+
+    # Проверяем всё до записи: пачка либо вставляется целиком, либо никак
+    websites, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            websites.append(WebsiteCreate.model_validate(item))
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors(include_url=False, include_context=False)})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    # Дубли внутри пачки и с базой отсеиваем по множеству URL
+    unique = list({website.url: website for website in reversed(websites)}.values())[::-1]
+    existing = set()
+    for urls in _chunks([website.url for website in unique]):
+        result = await db.execute(select(Website.url).where(Website.url.in_(urls)))
+        existing.update(result.scalars().all())
+    new_rows = [
+        Website(**website.model_dump()).model_dump(exclude={"id"})
+        for website in unique if website.url not in existing
+    ]
+
+    created = []
+    try:
+        for rows in _chunks(new_rows):
+            result = await db.scalars(insert(Website).returning(Website), rows)
+            created.extend(result.all())
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(400, "Website with this URL already exists")
+
+    for website in created:
+        site_scheduler.upsert(website)
+        status_board.track(website)
+    await _notify_bulk("websites.created", {"count": len(created), "ids": [w.id for w in created]})
+    return {
+        "created": len(created),
+        "ids": [website.id for website in created],
+        "skipped_duplicates": len(websites) - len(created),
+    }
+
+
+@router.patch("/bulk")
+async def update_websites_bulk(updates: List[WebsiteBulkUpdate], db: AsyncSession = Depends(get_db)):
+    # Обновления с одинаковым набором полей идут одним executemany
+    groups: dict[tuple, list[dict]] = {}
+    for item in updates:
+        values = item.model_dump(exclude_unset=True, exclude={"id"})
+        if values:
+            groups.setdefault(tuple(sorted(values)), []).append({"_id": item.id, **values})
+
+    conflicts = await _url_conflicts(db, {item.id: item.url for item in updates if item.url is not None})
+    if conflicts:
+        raise HTTPException(400, {"message": "Website with this URL already exists", "conflicts": conflicts})
+
+    try:
+        for fields, rows in groups.items():
+            stmt = (
+                update(Website.__table__)
+                .where(Website.__table__.c.id == bindparam("_id"))
+                .values({**{field: bindparam(field) for field in fields}, "updated_at": datetime.utcnow()})
+            )
+            await db.execute(stmt, rows)
+        await db.commit()
+    except IntegrityError as e:
+        # URL занял параллельный запрос уже после проверки
+        await db.rollback()
+        if not _is_url_conflict(e):
+            raise
+        raise HTTPException(400, "Website with this URL already exists")
+
+    ids = sorted({item.id for item in updates})
+    websites = []
+    for chunk in _chunks(ids):
+        result = await db.execute(
+            select(Website).where(Website.id.in_(chunk)).execution_options(populate_existing=True)
+        )
+        websites.extend(result.scalars().all())
+    for website in websites:
+        site_scheduler.upsert(website)
+        status_board.track(website)
+        probe_policy.forget(website.id)
+
+    found = {website.id for website in websites}
+    await _notify_bulk("websites.updated", {"count": len(found), "ids": sorted(found)})
+    return {"updated": len(found), "missing": [i for i in ids if i not in found]}
+
+
+@router.delete("/bulk")
+async def delete_websites_bulk(body: WebsiteIds, db: AsyncSession = Depends(get_db)):
+    ids = sorted(set(body.ids))
+    found = []
+    for chunk in _chunks(ids):
+        result = await db.execute(
+            delete(Website).where(Website.id.in_(chunk)).returning(Website.id)
+        )
+        found.extend(result.scalars().all())
+    await db.commit()
+
+    for website_id in found:
+        site_scheduler.remove(website_id)
+        status_board.remove(website_id)
+        transition_tracker.forget(website_id)
+        probe_policy.forget(website_id)
+    await _notify_bulk("websites.deleted", {"count": len(found), "ids": sorted(found)})
+    return {"deleted": len(found), "missing": sorted(set(ids) - set(found))}
+
+
+@router.get("/export")
+async def export_websites(format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    async def chunks():
+        # Пачками по id, каждая — в своей короткой сессии
+        last_id = 0
+        while True:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(*Website.__table__.columns)
+                    .where(Website.id > last_id)
+                    .order_by(Website.id)
+                    .limit(settings.export_chunk_size)
+                )
+                rows = result.all()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1].id
+
+    if format == "csv":
+        body, media_type = export_csv(chunks(), WEBSITE_COLUMNS), "text/csv"
+    else:
+        body, media_type = export_ndjson(chunks()), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="websites.{format}"'},
+    )
 
 
 @router.get("/{website_id}", response_model=Website)
@@ -45,8 +258,15 @@ async def create_website(
     
     new_website = Website(**website.dict())
     db.add(new_website)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Параллельный запрос успел создать сайт с тем же URL
+        await db.rollback()
+        raise HTTPException(400, "Website with this URL already exists")
     await db.refresh(new_website)
+    site_scheduler.upsert(new_website)
+    status_board.track(new_website)
 
     event = {"type": "website.created", "payload": new_website.dict()}
     await publish_event(event) or await ws_manager.broadcast_json(event)
@@ -62,12 +282,29 @@ async def update_website(
         raise HTTPException(status_code=404, detail="Website not found")
     
     update_data = update.dict(exclude_unset=True)
+    if "url" in update_data:
+        existing = await db.execute(
+            select(Website.id).where(Website.url == update_data["url"], Website.id != website_id)
+        )
+        if existing.scalar():
+            raise HTTPException(400, "Website with this URL already exists")
     for key, value in update_data.items():
         setattr(website, key, value)
     
     db.add(website)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        # URL занял параллельный запрос уже после проверки
+        await db.rollback()
+        if not _is_url_conflict(e):
+            raise
+        raise HTTPException(400, "Website with this URL already exists")
     await db.refresh(website)
+    site_scheduler.upsert(website)
+    status_board.track(website)
+    # Новый адрес или протокол — таймауты и breaker считаем заново
+    probe_policy.forget(website.id)
 
     event = {"type": "website.updated", "payload": website.dict()}
     await publish_event(event) or await ws_manager.broadcast_json(event)
@@ -82,6 +319,10 @@ async def delete_website(website_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(website)
     await db.commit()
+    site_scheduler.remove(website_id)
+    status_board.remove(website_id)
+    transition_tracker.forget(website_id)
+    probe_policy.forget(website_id)
 
     event = {"type": "website.deleted", "payload": {"id": website_id}}
     await publish_event(event) or await ws_manager.broadcast_json(event)
@@ -90,18 +331,51 @@ async def delete_website(website_id: int, db: AsyncSession = Depends(get_db)):
 @router.get("/{website_id}/checks", response_model=List[CheckResult])
 async def get_website_checks(
     website_id: int,
-    limit: int = Query(50, ge=1, le=200),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor из предыдущего ответа"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
     db: AsyncSession = Depends(get_db),
 ):
     website = await db.get(Website, website_id)
     if not website:
         raise HTTPException(status_code=404, detail="Website not found")
-    
-    stmt = (
-        select(CheckResult)
-        .where(CheckResult.website_id == website_id)
-        .order_by(CheckResult.checked_at.desc())
-        .limit(limit)
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Берём на одну строку больше, чтобы знать, есть ли следующая страница
+    result = await db.execute(history_query(website_id, since, until, after).limit(limit + 1))
+    rows = result.all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].checked_at, rows[-1].id)
+    return FastJSONResponse([dict(row._mapping) for row in rows], headers=headers)
+
+
+@router.get("/{website_id}/checks/export")
+async def export_website_checks(
+    website_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    # Потоковая выгрузка всей истории пачками: память не зависит от числа строк
+    website = await db.get(Website, website_id)
+    if not website:
+        raise HTTPException(status_code=404, detail="Website not found")
+
+    rows = iter_history(website_id, since, until)
+    if format == "csv":
+        body, media_type = export_csv(rows), "text/csv"
+    else:
+        body, media_type = export_ndjson(rows), "application/x-ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="website-{website_id}-checks.{format}"'},
     )
-    result = await db.execute(stmt)
-    return result.scalars().all()
\ No newline at end of file
@@ -6,4 +6,121 @@ class Settings:
     debug: bool = True
     database_url: str = "sqlite+aiosqlite:///./monitoring.db"
 
-settings = Settings()
\ No newline at end of file
+    # Настройки SQLite (PRAGMA при каждом подключении)
+    sqlite_mmap_size: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    sqlite_cache_kb: int = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    # Параллельные проверки сайтов
+    check_concurrency: int = int(os.getenv("CHECK_CONCURRENCY", "50"))
+    check_per_host_limit: int = int(os.getenv("CHECK_PER_HOST_LIMIT", "2"))
+
+    # Планировщик: минимальный интервал и доля случайного сдвига запуска
+    check_min_interval: float = float(os.getenv("CHECK_MIN_INTERVAL", "5"))
+    check_jitter: float = float(os.getenv("CHECK_JITTER", "0.1"))
+
+    # Общий пул HTTP-соединений для проверок
+    http_timeout: float = float(os.getenv("HTTP_TIMEOUT", "10"))
+    tcp_timeout: float = float(os.getenv("TCP_TIMEOUT", "5"))
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    http_max_keepalive: int = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+    http2: bool = os.getenv("HTTP2", "0") == "1"
+
+    # Адаптивный таймаут: p95 последних задержек * коэффициент (не больше базового)
+    adaptive_timeout_factor: float = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "3"))
+    adaptive_timeout_min: float = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "1"))
+    adaptive_timeout_window: int = int(os.getenv("ADAPTIVE_TIMEOUT_WINDOW", "50"))
+    adaptive_timeout_min_samples: int = int(os.getenv("ADAPTIVE_TIMEOUT_MIN_SAMPLES", "5"))
+    # Повтор перед признанием падения и пауза для упавших сайтов (секунды)
+    confirm_retry_delay: float = float(os.getenv("CONFIRM_RETRY_DELAY", "0.5"))
+    breaker_threshold: int = int(os.getenv("BREAKER_THRESHOLD", "3"))
+    breaker_max_backoff: float = float(os.getenv("BREAKER_MAX_BACKOFF", "1800"))
+
+    # Логи: JSON (или text) в stdout из фонового потока. LOG_LEVELS задаёт
+    # уровни подсистем: "app.nats=DEBUG,app.tasks.scheduler=WARNING".
+    # Одинаковые строки — не больше LOG_RATE_LIMIT за LOG_RATE_WINDOW секунд
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_levels: str = os.getenv("LOG_LEVELS", "")
+    log_format: str = os.getenv("LOG_FORMAT", "json")
+    log_rate_limit: int = int(os.getenv("LOG_RATE_LIMIT", "10"))
+    log_rate_window: float = float(os.getenv("LOG_RATE_WINDOW", "10"))
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Как часто меряем задержку event loop для /metrics (секунды)
+    loop_lag_interval: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+
+    # Кэш DNS для HTTP и TCP проверок (секунды, записи)
+    dns_cache_ttl: float = float(os.getenv("DNS_CACHE_TTL", "300"))
+    dns_negative_ttl: float = float(os.getenv("DNS_NEGATIVE_TTL", "30"))
+    dns_cache_size: int = int(os.getenv("DNS_CACHE_SIZE", "1024"))
+
+    # PING: число echo-запросов за проверку, интервал и ожидание ответа (секунды)
+    ping_count: int = int(os.getenv("PING_COUNT", "3"))
+    ping_interval: float = float(os.getenv("PING_INTERVAL", "0.2"))
+    ping_timeout: float = float(os.getenv("PING_TIMEOUT", "2"))
+
+    # Отложенная пакетная запись результатов проверок
+    db_write_batch_size: int = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+    db_flush_interval: float = float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+    db_write_queue_size: int = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))
+
+    # Размер пачки при потоковой выгрузке истории проверок
+    export_chunk_size: int = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+    # События: full — check.completed на каждую проверку,
+    # transitions — только переходы состояния и периодические снимки
+    event_mode: str = os.getenv("EVENT_MODE", "full")
+    flap_down_after: int = int(os.getenv("FLAP_DOWN_AFTER", "2"))
+    flap_up_after: int = int(os.getenv("FLAP_UP_AFTER", "2"))
+    latency_degraded_factor: float = float(os.getenv("LATENCY_DEGRADED_FACTOR", "3.0"))
+    snapshot_interval: float = float(os.getenv("SNAPSHOT_INTERVAL", "15"))
+
+    # WebSocket: очередь на клиента и что делать с медленными клиентами
+    ws_queue_size: int = int(os.getenv("WS_QUEUE_SIZE", "256"))
+    ws_slow_policy: str = os.getenv("WS_SLOW_POLICY", "drop_oldest")  # drop_oldest | drop_new | disconnect
+    ws_send_timeout: float = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+    # NATS: пакетная публикация и локальный outbox на время недоступности
+    nats_url: str = os.getenv("NATS_URL", "nats://127.0.0.1:4222")
+    nats_subject: str = os.getenv("NATS_SUBJECT", "monitoring.events")
+    nats_connect_wait: float = float(os.getenv("NATS_CONNECT_WAIT", "2"))
+    nats_reconnect_wait: float = float(os.getenv("NATS_RECONNECT_WAIT", "2"))
+    nats_batch_interval: float = float(os.getenv("NATS_BATCH_INTERVAL", "0.05"))
+    nats_batch_max_events: int = int(os.getenv("NATS_BATCH_MAX_EVENTS", "200"))
+    nats_batch_max_bytes: int = int(os.getenv("NATS_BATCH_MAX_BYTES", str(512 * 1024)))
+    nats_compression: bool = os.getenv("NATS_COMPRESSION", "0") == "1"
+    nats_compress_min_bytes: int = int(os.getenv("NATS_COMPRESS_MIN_BYTES", "1024"))
+    nats_outbox_path: str = os.getenv("NATS_OUTBOX_PATH", "./nats_outbox.db")
+    nats_outbox_max: int = int(os.getenv("NATS_OUTBOX_MAX", "100000"))
+
+    # Где выполняются проверки: local — в процессе API, nats — воркерами
+    # (python -m app.tasks.worker) через queue group, processes — в
+    # CHECK_WORKERS дочерних процессах на этой же машине
+    check_executor: str = os.getenv("CHECK_EXECUTOR", "local")
+    check_workers: int = int(os.getenv("CHECK_WORKERS", str(os.cpu_count() or 2)))
+    nats_jobs_subject: str = os.getenv("NATS_JOBS_SUBJECT", "monitoring.jobs")
+    nats_queue_group: str = os.getenv("NATS_QUEUE_GROUP", "checkers")
+    job_ack_timeout: float = float(os.getenv("JOB_ACK_TIMEOUT", "2"))
+    job_lease_seconds: float = float(os.getenv("JOB_LEASE_SECONDS", "15"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # Хранение истории (в днях, 0 — хранить всегда). Удаление сырых
+    # проверок включается явно: по умолчанию они не удаляются
+    retention_raw_days: int = int(os.getenv("RETENTION_RAW_DAYS", "0"))
+    retention_minute_days: int = int(os.getenv("RETENTION_MINUTE_DAYS", "2"))
+    retention_hour_days: int = int(os.getenv("RETENTION_HOUR_DAYS", "90"))
+    retention_day_days: int = int(os.getenv("RETENTION_DAY_DAYS", "0"))
+    retention_interval: float = float(os.getenv("RETENTION_INTERVAL", "3600"))
+    retention_batch_size: int = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+    retention_pause: float = float(os.getenv("RETENTION_PAUSE", "0.05"))
+    retention_vacuum_pages: int = int(os.getenv("RETENTION_VACUUM_PAGES", "2000"))
+
+    # Архив сырых проверок в Parquet (нужен pyarrow). Законченные дни старше
+    # ARCHIVE_AFTER_DAYS переносятся из SQLite в файлы при каждой очистке
+    archive_enabled: bool = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+    archive_path: str = os.getenv("ARCHIVE_PATH", "./archive")
+    archive_after_days: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "2"))
+    archive_compression: str = os.getenv("ARCHIVE_COMPRESSION", "zstd")
+
+settings = Settings()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from app.config import settings
+
+# Архив старых проверок в Parquet: один файл на сайт и день,
+#   <ARCHIVE_PATH>/day=YYYY-MM-DD/website_id=N/checks.parquet
+# Повтор после сбоя (например, посреди удаления строк из SQLite) переписывает
+# тот же файл: строки, уже удалённые из базы, берутся из прежнего файла,
+# а оставшиеся — из базы, поэтому нет ни дублей, ни потерь. pyarrow — необязательная
+# зависимость: без него архив выключен, а очистка работает как раньше.
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARCHIVE_COLUMNS = [
+    "id", "website_id", "checked_at", "is_up", "status_code", "response_time",
+    "error_message", "dns_time", "connect_time", "tls_time", "ttfb", "packet_loss", "jitter",
+]
+
+
+def archive_available() -> bool:
+    return pa is not None and settings.archive_enabled
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("website_id", pa.int32()),
+        ("checked_at", pa.timestamp("us")),
+        ("is_up", pa.bool_()),
+        ("status_code", pa.int16()),
+        ("response_time", pa.float32()),
+        ("error_message", pa.string()),
+        ("dns_time", pa.float32()),
+        ("connect_time", pa.float32()),
+        ("tls_time", pa.float32()),
+        ("ttfb", pa.float32()),
+        ("packet_loss", pa.float32()),
+        ("jitter", pa.float32()),
+    ])
+
+
+PARTITION_FILE = "checks.parquet"
+
+
+def partition_dir(day: date, website_id: int) -> Path:
+    return Path(settings.archive_path) / f"day={day.isoformat()}" / f"website_id={website_id}"
+
+
+async def write_partition(day: date, website_id: int, chunks: AsyncIterator[list]) -> tuple[int, Optional[int]]:
+    # Пишет пачки строк одной партиции как row group'ы одного файла.
+    # Возвращает (число строк, последний id) — по ним потом удаляются строки из SQLite.
+    schema = _schema()
+    final_path = partition_dir(day, website_id) / PARTITION_FILE
+    tmp_path = final_path.with_suffix(".tmp")
+    writer = None
+    rows_written, last_id = 0, None
+    ids: list[int] = []
+    try:
+        async for rows in chunks:
+            if writer is None:
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                writer = pq.ParquetWriter(tmp_path, schema, compression=settings.archive_compression)
+            columns = {name: [getattr(row, name) for row in rows] for name in ARCHIVE_COLUMNS}
+            table = pa.Table.from_pydict(columns, schema=schema)
+            # Сжатие и запись — в потоке, чтобы не держать event loop
+            await asyncio.to_thread(writer.write_table, table)
+            rows_written += len(rows)
+            last_id = rows[-1].id
+            ids.extend(columns["id"])
+        if writer is not None and final_path.exists():
+            # Файл от прерванного прогона: переносим строки, которых уже нет в базе
+            await asyncio.to_thread(_carry_over, final_path, writer, ids)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            tmp_path.unlink(missing_ok=True)
+        raise
+    if writer is not None:
+        writer.close()
+        # Файл появляется под своим именем только целиком
+        os.replace(tmp_path, final_path)
+    return rows_written, last_id
+
+
+def _carry_over(path: Path, writer, ids: list[int]) -> None:
+    previous = pq.read_table(path, schema=writer.schema)
+    previous = previous.filter(pc.invert(pc.is_in(previous["id"], value_set=pa.array(ids, pa.int64()))))
+    if previous.num_rows:
+        writer.write_table(previous)
+
+
+def _partition_files(website_id: int, since: date, until: date) -> list[Path]:
+    # Отбор партиций по пути: чужие сайты и дни не открываются вовсе
+    files = []
+    day = since
+    while day <= until:
+        directory = partition_dir(day, website_id)
+        if directory.is_dir():
+            files.extend(sorted(directory.glob("*.parquet")))
+        day += timedelta(days=1)
+    return files
+
+
+def read_uptime(website_id: int, since: datetime, until: datetime) -> dict:
+    # Читает только нужные колонки, файлы открываются через mmap.
+    # Синхронная функция — вызывать через asyncio.to_thread.
+    columns = ["checked_at", "is_up", "response_time"]
+    files = _partition_files(website_id, since.date(), until.date())
+    tables = [pq.read_table(path, columns=columns, memory_map=True) for path in files]
+    if not tables:
+        return {"files": 0, "checks": 0, "uptime_pct": None, "latency_avg": None, "latency_p95": None, "days": []}
+
+    table = pa.concat_tables(tables)
+    in_range = pc.and_(
+        pc.greater_equal(table["checked_at"], pa.scalar(since, pa.timestamp("us"))),
+        pc.less(table["checked_at"], pa.scalar(until, pa.timestamp("us"))),
+    )
+    table = table.filter(in_range)
+    total = table.num_rows
+
+    up = table.filter(table["is_up"])
+    latency = up["response_time"]
+    by_day = (
+        table.append_column("day", pc.strftime(table["checked_at"], format="%Y-%m-%d"))
+        .append_column("up", pc.cast(table["is_up"], pa.int32()))
+        .group_by("day")
+        .aggregate([("up", "sum"), ("up", "count")])
+        .sort_by("day")
+    )
+    return {
+        "files": len(files),
+        "checks": total,
+        "uptime_pct": round(up.num_rows * 100 / total, 3) if total else None,
+        "latency_avg": round(pc.mean(latency).as_py(), 2) if up.num_rows else None,
+        "latency_p95": round(pc.quantile(latency, q=0.95)[0].as_py(), 2) if up.num_rows else None,
+        "days": [
+            {"day": day, "checks": count, "uptime_pct": round(ups * 100 / count, 3)}
+            for day, ups, count in zip(
+                by_day["day"].to_pylist(), by_day["up_sum"].to_pylist(), by_day["up_count"].to_pylist()
+            )
+        ],
+    }
@@ -0,0 +1,113 @@
+import base64
+import csv
+import io
+from datetime import datetime, timezone
+from enum import Enum
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select, tuple_
+
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.check_result import CheckResult
+from app.serialization import dumps
+
+# Чтение истории проверок по ключу (checked_at, id): страница продолжается
+# с последней строки предыдущей, без OFFSET, поэтому глубина страницы не
+# влияет на скорость. Поиск идёт по индексу (website_id, checked_at),
+# id в SQLite — rowid и уже лежит в этом индексе.
+
+HISTORY_COLUMNS = [column.name for column in CheckResult.__table__.columns]
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # В базе время хранится без зоны, в UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def encode_cursor(checked_at: datetime, row_id: int) -> str:
+    raw = f"{checked_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    # ValueError для повреждённого курсора
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        checked_at, row_id = raw.split("|")
+        return datetime.fromisoformat(checked_at), int(row_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def history_query(
+    website_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    after: Optional[tuple[datetime, int]] = None,
+    descending: bool = True,
+):
+    key = tuple_(CheckResult.checked_at, CheckResult.id)
+    stmt = select(*CheckResult.__table__.columns).where(CheckResult.website_id == website_id)
+    if since is not None:
+        stmt = stmt.where(CheckResult.checked_at >= to_utc(since))
+    if until is not None:
+        stmt = stmt.where(CheckResult.checked_at < to_utc(until))
+    if after is not None:
+        stmt = stmt.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    if descending:
+        return stmt.order_by(CheckResult.checked_at.desc(), CheckResult.id.desc())
+    return stmt.order_by(CheckResult.checked_at, CheckResult.id)
+
+
+async def iter_history(
+    website_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: Optional[int] = None,
+) -> AsyncIterator[list]:
+    # Пачки строк от старых к новым. Каждая пачка — отдельная короткая
+    # сессия: долгий экспорт не держит транзакцию чтения и не мешает
+    # checkpoint WAL и записи новых проверок.
+    chunk_size = chunk_size or settings.export_chunk_size
+    after = None
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                history_query(website_id, since, until, after, descending=False).limit(chunk_size)
+            )
+            rows = result.all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].checked_at, rows[-1].id)
+
+
+async def export_ndjson(rows_iter: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for rows in rows_iter:
+        yield b"".join(dumps(dict(row._mapping)) + b"\n" for row in rows)
+
+
+async def export_csv(rows_iter: AsyncIterator[list], columns: list[str] = HISTORY_COLUMNS) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    async for rows in rows_iter:
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime)
+                else value.value if isinstance(value, Enum) else value
+                for value in row
+            ]
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
@@ -0,0 +1,139 @@
+import zlib
+import logging
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlmodel import SQLModel
+
+from app.db.rollups import RollupAggregator, parse_histogram
+
+# Модели должны быть импортированы, чтобы попасть в metadata
+from app.models.website import Website  # noqa: F401
+from app.models.check_result import CheckResult  # noqa: F401
+from app.models.rollup import CheckRollup  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+def schema_fingerprint() -> int:
+    # Версия схемы по описанию моделей: меняется при новой таблице, колонке или индексе
+    parts = []
+    for table in SQLModel.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type}:{c.nullable}" for c in table.columns)
+        parts.extend(sorted(f"ix:{index.name}" for index in table.indexes))
+    return zlib.crc32("|".join(parts).encode()) & 0x7FFFFFFF
+
+
+def ensure_schema(sync_conn) -> bool:
+    # create_all и миграции — только если версия в PRAGMA user_version
+    # не совпадает с текущими моделями. Возвращает True, если схема обновлялась.
+    sqlite = sync_conn.dialect.name == "sqlite"
+    version = schema_fingerprint()
+    if sqlite and sync_conn.exec_driver_sql("PRAGMA user_version").scalar() == version:
+        return False
+    SQLModel.metadata.create_all(sync_conn)
+    complete = upgrade_schema(sync_conn)
+    # Версию ставим, только если прошли все шаги: иначе при следующем
+    # запуске миграции не повторились бы
+    if sqlite and complete:
+        sync_conn.exec_driver_sql(f"PRAGMA user_version={version}")
+    elif sqlite:
+        logger.warning("Схема обновлена не полностью, миграции повторятся при следующем запуске")
+    return True
+
+
+def upgrade_schema(sync_conn) -> bool:
+    # create_all не меняет существующие таблицы, поэтому новые
+    # nullable-колонки добавляем вручную через ALTER TABLE.
+    # Возвращает False, если какой-то шаг не удался.
+    complete = True
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            col_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(
+                text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}')
+            )
+            logger.info("Добавлена колонка %s.%s", table.name, column.name)
+
+        # Индексы create_all тоже создаёт только вместе с новой таблицей
+        existing_indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                with sync_conn.begin_nested():
+                    index.create(sync_conn)
+                logger.info("Создан индекс %s", index.name)
+            except Exception as e:
+                # Например, уникальный индекс по URL при уже имеющихся дубликатах
+                logger.warning("Не удалось создать индекс %s: %s", index.name, e)
+                complete = False
+
+    backfill_rollups(sync_conn)
+    backfill_latency_counts(sync_conn)
+    return complete
+
+
+def backfill_rollups(sync_conn, chunk_size: int = 5000) -> None:
+    # Агрегаты для истории, записанной до появления таблицы checkrollup
+    has_rollups = sync_conn.execute(select(CheckRollup.website_id).limit(1)).first()
+    has_checks = sync_conn.execute(select(CheckResult.id).limit(1)).first()
+    if has_rollups or not has_checks:
+        return
+
+    aggregator = RollupAggregator()
+    table = CheckResult.__table__
+    last_id = 0
+    total = 0
+    while True:
+        rows = sync_conn.execute(
+            select(table).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+        ).mappings().all()
+        if not rows:
+            break
+        aggregator.apply(sync_conn, [dict(r) for r in rows])
+        aggregator.commit_state()
+        last_id = rows[-1]["id"]
+        total += len(rows)
+    logger.info("Агрегаты статистики построены по %d проверкам", total)
+
+
+def backfill_latency_counts(sync_conn, chunk_size: int = 5000) -> None:
+    # latency_count появился позже агрегатов: восстанавливаем его по гистограмме
+    table = CheckRollup.__table__
+    stmt = (
+        update(table)
+        .where(table.c.website_id == bindparam("_website_id"))
+        .where(table.c.resolution == bindparam("_resolution"))
+        .where(table.c.bucket_start == bindparam("_bucket_start"))
+        .values(latency_count=bindparam("_latency_count"))
+    )
+    total = 0
+    while True:
+        rows = sync_conn.execute(
+            select(table.c.website_id, table.c.resolution, table.c.bucket_start, table.c.histogram)
+            .where(table.c.latency_count.is_(None))
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        sync_conn.execute(stmt, [
+            {
+                "_website_id": website_id,
+                "_resolution": resolution,
+                "_bucket_start": bucket,
+                "_latency_count": sum(parse_histogram(histogram).values()),
+            }
+            for website_id, resolution, bucket, histogram in rows
+        ])
+        total += len(rows)
+    if total:
+        logger.info("Число задержек в агрегатах восстановлено для %d корзин", total)
@@ -0,0 +1,231 @@
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.models.check_result import CheckResult
+from app.models.rollup import CheckRollup
+from app.models.website import Website
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+
+# Логарифмическая шкала задержек: каждая корзина на 25% шире предыдущей,
+# поэтому перцентили получаются с погрешностью не больше ~12%
+_LATENCY_BASE = 1.25
+
+
+def latency_bin(ms: float) -> int:
+    if ms <= 1:
+        return 0
+    return int(math.log(ms, _LATENCY_BASE)) + 1
+
+
+def bin_upper(index: int) -> float:
+    return _LATENCY_BASE ** index
+
+
+def parse_histogram(raw: str) -> Counter:
+    hist = Counter()
+    if raw:
+        for part in raw.split(","):
+            index, count = part.split(":")
+            hist[int(index)] += int(count)
+    return hist
+
+
+def format_histogram(hist: Counter) -> str:
+    return ",".join(f"{i}:{c}" for i, c in sorted(hist.items()) if c)
+
+
+def percentile(hist: Counter, q: float) -> Optional[float]:
+    total = sum(hist.values())
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for index in sorted(hist):
+        seen += hist[index]
+        if seen >= rank:
+            # Середина корзины в логарифмической шкале
+            return round(math.sqrt(bin_upper(index - 1) * bin_upper(index)) if index else 1.0, 2)
+    return round(bin_upper(max(hist)), 2)
+
+
+def bucket_start(moment: datetime, resolution: int) -> datetime:
+    if resolution == DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(second=0, microsecond=0)
+
+
+def window_resolution(window: timedelta) -> int:
+    # Выбираем разрешение так, чтобы окно занимало не больше ~200 корзин
+    if window <= timedelta(hours=3):
+        return MINUTE
+    if window <= timedelta(days=7):
+        return HOUR
+    return DAY
+
+
+class RollupAggregator:
+    # Инкрементально обновляет CheckRollup по каждой записанной пачке результатов.
+    # Вызывается внутри транзакции вставки, поэтому сырые строки и агрегаты
+    # сохраняются атомарно.
+    def __init__(self) -> None:
+        self._last_up: dict[int, bool] = {}
+        self._pending: dict[int, bool] = {}
+
+    def load_state(self, sync_conn) -> None:
+        # Последнее состояние сайтов до перезапуска: без него первое падение
+        # после старта не считалось бы инцидентом
+        latest_id = (
+            select(CheckResult.id)
+            .where(CheckResult.website_id == Website.id)
+            .order_by(CheckResult.checked_at.desc())
+            .limit(1)
+            .correlate(Website)
+            .scalar_subquery()
+        )
+        result = sync_conn.execute(
+            select(Website.id, CheckResult.is_up).outerjoin(CheckResult, CheckResult.id == latest_id)
+        )
+        for website_id, is_up in result.all():
+            if is_up is not None:
+                self._last_up.setdefault(website_id, bool(is_up))
+
+    def apply(self, sync_conn, rows: list[dict]) -> None:
+        self._pending = {}
+        deltas: dict[tuple, dict] = {}
+
+        for row in sorted(rows, key=lambda r: r["checked_at"]):
+            website_id = row["website_id"]
+            is_up = bool(row["is_up"])
+            previous = self._pending.get(website_id, self._last_up.get(website_id))
+            incident = previous is True and not is_up
+            self._pending[website_id] = is_up
+            latency = row.get("response_time")
+
+            for resolution in RESOLUTIONS:
+                key = (website_id, resolution, bucket_start(row["checked_at"], resolution))
+                delta = deltas.get(key)
+                if delta is None:
+                    delta = deltas[key] = {
+                        "count": 0, "up_count": 0, "incidents": 0,
+                        "latency_sum": 0.0, "latency_max": None, "hist": Counter(),
+                    }
+                delta["count"] += 1
+                delta["incidents"] += incident
+                if is_up:
+                    delta["up_count"] += 1
+                    if latency is not None:
+                        delta["latency_sum"] += latency
+                        delta["latency_max"] = max(delta["latency_max"] or 0.0, latency)
+                        delta["hist"][latency_bin(latency)] += 1
+
+        if not deltas:
+            return
+
+        # Текущие значения затронутых корзин — одним запросом
+        existing = {}
+        keys = list(deltas)
+        for i in range(0, len(keys), 300):
+            chunk = keys[i:i + 300]
+            result = sync_conn.execute(
+                select(CheckRollup.__table__).where(
+                    tuple_(
+                        CheckRollup.website_id,
+                        CheckRollup.resolution,
+                        CheckRollup.bucket_start,
+                    ).in_(chunk)
+                )
+            )
+            for r in result.mappings():
+                existing[(r["website_id"], r["resolution"], r["bucket_start"])] = r
+
+        values = []
+        for key, delta in deltas.items():
+            old = existing.get(key)
+            hist = delta["hist"]
+            row = {
+                "website_id": key[0],
+                "resolution": key[1],
+                "bucket_start": key[2],
+                "count": delta["count"],
+                "up_count": delta["up_count"],
+                "incidents": delta["incidents"],
+                "latency_sum": delta["latency_sum"],
+                "latency_max": delta["latency_max"],
+            }
+            if old is not None:
+                hist = hist + parse_histogram(old["histogram"])
+                row["count"] += old["count"]
+                row["up_count"] += old["up_count"]
+                row["incidents"] += old["incidents"]
+                row["latency_sum"] += old["latency_sum"]
+                if old["latency_max"] is not None:
+                    row["latency_max"] = max(row["latency_max"] or 0.0, old["latency_max"])
+            row["histogram"] = format_histogram(hist)
+            row["latency_count"] = sum(hist.values())
+            values.append(row)
+
+        stmt = sqlite_insert(CheckRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["website_id", "resolution", "bucket_start"],
+            set_={
+                name: stmt.excluded[name]
+                for name in (
+                    "count", "up_count", "incidents", "latency_sum", "latency_max", "latency_count", "histogram",
+                )
+            },
+        )
+        sync_conn.execute(stmt, values)
+
+    def commit_state(self) -> None:
+        # Состояние сайтов обновляем только после успешной транзакции
+        self._last_up.update(self._pending)
+        self._pending = {}
+
+
+def summarize(rollups) -> dict:
+    count = up_count = incidents = 0
+    latency_sum = 0.0
+    latency_max = None
+    hist = Counter()
+    for r in rollups:
+        count += r.count
+        up_count += r.up_count
+        incidents += r.incidents
+        latency_sum += r.latency_sum
+        if r.latency_max is not None:
+            latency_max = max(latency_max or 0.0, r.latency_max)
+        hist.update(parse_histogram(r.histogram))
+
+    latency_count = sum(hist.values())
+
+    def clamp(value: Optional[float]) -> Optional[float]:
+        # Оценка по корзине не может превышать реальный максимум
+        if value is None or latency_max is None:
+            return value
+        return round(min(value, latency_max), 2)
+
+    return {
+        "checks": count,
+        "up_checks": up_count,
+        "uptime_pct": round(up_count * 100 / count, 3) if count else None,
+        "incidents": incidents,
+        "latency_avg": round(latency_sum / latency_count, 2) if latency_count else None,
+        "latency_max": round(latency_max, 2) if latency_max is not None else None,
+        "p50": clamp(percentile(hist, 0.50)),
+        "p95": clamp(percentile(hist, 0.95)),
+        "p99": clamp(percentile(hist, 0.99)),
+    }
+
+
+rollup_aggregator = RollupAggregator()
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Union
+
+from sqlalchemy import insert
+
+from app import metrics
+from app.config import settings
+from app.db.rollups import rollup_aggregator
+from app.db.session import engine
+from app.models.check_result import CheckResult
+
+logger = logging.getLogger(__name__)
+
+# Маркер остановки в очереди: всё, что поставлено до него, будет записано
+_STOP = object()
+
+
+class ResultWriter:
+    # Отложенная запись результатов проверок: копим строки в очереди
+    # и вставляем пачкой по размеру или по времени
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def add(self, check: Union[CheckResult, dict]) -> None:
+        # Если очередь заполнена, вызывающий ждёт — это и есть backpressure
+        row = check if isinstance(check, dict) else check.model_dump(exclude={"id"})
+        self.start()
+        await self._queue.put(row)
+        self.enqueued += 1
+
+    async def write(self, checks: list) -> None:
+        # Немедленная запись мимо очереди (например, демо-история при старте)
+        rows = [c if isinstance(c, dict) else c.model_dump(exclude={"id"}) for c in checks]
+        for i in range(0, len(rows), self.batch_size):
+            await self._flush(rows[i:i + self.batch_size])
+
+    async def _collect(self) -> list[dict]:
+        batch = []
+        item = await self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item is _STOP:
+                self._stopping = True
+                break
+            batch.append(item)
+            timeout = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        # Текущая пачка всегда дописывается: задачу не отменяем, а
+        # останавливаем маркером в очереди
+        while not self._stopping:
+            batch = await self._collect()
+            await self._flush(batch)
+
+    async def _flush(self, rows: list[dict]) -> None:
+        if not rows:
+            return
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(insert(CheckResult), rows)
+                    # Агрегаты для статистики обновляются в той же транзакции
+                    await conn.run_sync(rollup_aggregator.apply, rows)
+                rollup_aggregator.commit_state()
+                break
+            except Exception as e:
+                logger.error("Ошибка записи %d результатов проверок: %s", len(rows), e)
+                if attempt:
+                    self.dropped += len(rows)
+                    return
+                await asyncio.sleep(0.5)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.db_flush_duration.observe(elapsed / 1000)
+        self.written += len(rows)
+        self.flushes += 1
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+
+    async def stop(self) -> None:
+        # Фоновая задача дописывает собранную пачку и выходит на маркере,
+        # затем дописываем то, что успели добавить после него
+        if self._task is not None and not self._task.done():
+            await self._queue.put(_STOP)
+            await self._task
+        self._task = None
+
+        rows = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                rows.append(item)
+        for i in range(0, len(rows), self.batch_size):
+            await self._flush(rows[i:i + self.batch_size])
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+result_writer = ResultWriter(
+    batch_size=settings.db_write_batch_size,
+    flush_interval=settings.db_flush_interval,
+    max_queue=settings.db_write_queue_size,
+)
+
+metrics.db_rows_written.set_function(lambda: result_writer.written)
+metrics.db_rows_dropped.set_function(lambda: result_writer.dropped)
+metrics.db_queue_depth.set_function(lambda: result_writer._queue.qsize())
@@ -0,0 +1,187 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import settings
+
+# Логирование без блокировки event loop: в потоке вызывающего запись только
+# проходит фильтры и кладётся в очередь, форматирование в JSON и запись
+# в stdout делает фоновый поток QueueListener. Переполненная очередь
+# отбрасывает записи, а не ждёт.
+#
+#   LOG_LEVEL=INFO  LOG_LEVELS=app.nats=DEBUG,app.tasks.scheduler=WARNING
+#   LOG_FORMAT=json|text  LOG_RATE_LIMIT=10  LOG_RATE_WINDOW=10
+
+# Поля корреляции (website_id, cycle_id, ...) текущей задачи asyncio
+_context: contextvars.ContextVar[dict] = contextvars.ContextVar("log_context", default={})
+
+# Стандартные атрибуты LogRecord — всё остальное считаем полями из extra
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+
+@contextmanager
+def log_context(**fields):
+    # Поля добавляются ко всем записям внутри блока, включая дочерние задачи
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    # Не больше limit записей одного шаблона за окно window секунд.
+    # Ключ — логгер и шаблон сообщения (до подстановки аргументов), поэтому
+    # «ошибка проверки сайта %s» для разных сайтов считается одной строкой.
+    # Первая запись следующего окна несёт число пропущенных.
+    def __init__(self, limit: int, window: float) -> None:
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._buckets: dict[tuple, list] = {}  # ключ -> [начало окна, записей, пропущено]
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0 or record.levelno >= logging.CRITICAL:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None or now - bucket[0] >= self.window:
+            skipped = bucket[2] if bucket else 0
+            if len(self._buckets) > 10000:
+                self._buckets.clear()
+            self._buckets[key] = [now, 1, 0]
+            if skipped:
+                record.suppressed = skipped
+            return True
+        if bucket[1] < self.limit:
+            bucket[1] += 1
+            return True
+        bucket[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Подставляем аргументы здесь: они могут измениться, пока запись в очереди.
+        # Исключение превращаем в текст, остальные поля оставляем как есть
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{k}={v}" for k, v in record.__dict__.items() if k not in _RESERVED)
+        return f"{line} {fields}" if fields else line
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    # Повторный вызов (несколько lifespan в тестах, воркеры) ничего не меняет
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "text":
+        stream.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(ContextFilter())
+    _queue_handler.addFilter(RateLimitFilter(settings.log_rate_limit, settings.log_rate_window))
+
+    # Настраиваем только логгеры приложения, логи uvicorn не трогаем
+    root = logging.getLogger("app")
+    root.setLevel(settings.log_level.upper())
+    root.handlers[:] = [_queue_handler]
+    root.propagate = False
+    for name, level in _parse_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    # Дописывает всё, что осталось в очереди
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def stats() -> dict:
+    if _queue_handler is None:
+        return {"enabled": False}
+    rate_limit = next(f for f in _queue_handler.filters if isinstance(f, RateLimitFilter))
+    return {
+        "enabled": True,
+        "queue_depth": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+        "suppressed": rate_limit.suppressed,
+    }
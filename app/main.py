@@ -1,25 +1,44 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import SQLModel, select
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlmodel import select
 from datetime import datetime
 import asyncio
+import inspect
+import logging
+import time
+from typing import Optional
 
+from app import metrics
 from app.config import settings
 from app.db.session import engine, AsyncSessionLocal
+from app.db.migrations import ensure_schema
+from app.db.rollups import rollup_aggregator
+from app.db.writer import result_writer
+from app.serialization import FastJSONResponse
+from app.log import setup_logging, stop_logging
 
 from app.api.routes.websites import router as websites_router
 from app.api.routes.monitoring import router as monitoring_router
+from app.api.routes.stats import router as stats_router
 from app.ws.monitoring_ws import router as ws_monitoring_router
 from app.nats.client import connect_nats, close_nats
-from app.tasks.site_checker import start_background_checker
+from app.tasks.site_checker import start_background_checker, stop_background_checker
+from app.tasks.http_client import start_http_client, close_http_client
+from app.tasks.process_pool import process_executor
+from app.tasks.retention import start_retention, stop_retention
+from app.tasks.status_board import status_board
 from app.models.website import Website, ProtocolType
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="Мониторинг Сайтов",
     version="Aльфа 0.1",
     docs_url="/docs",
     description="Система мониторинга доступности веб-сайтов",
+    default_response_class=FastJSONResponse,
 )
 
 # Настройка CORS
@@ -33,15 +52,13 @@ app.add_middleware(
 async def seed_database():
     # Заполнение базы данных демо-сайтами при первом запуске
     async with AsyncSessionLocal() as session:
-        # Проверяем, есть ли уже сайты в базе
-        result = await session.execute(select(Website))
-        existing_websites = result.scalars().all()
-        
-        if existing_websites:
-            print(f"В базе уже есть {len(existing_websites)} сайтов")
+        # Проверяем, есть ли уже сайты в базе (одна строка, без загрузки таблицы)
+        result = await session.execute(select(Website.id).limit(1))
+        if result.first() is not None:
+            logger.info("В базе уже есть сайты")
             return False
         
-        print("База данных пустая, загружаю демо-сайты...")
+        logger.info("База данных пустая, загружаю демо-сайты...")
         
         # Список из 30 демо-сайтов для мониторинга
         demo_websites = [
@@ -103,7 +120,7 @@ async def seed_database():
             websites_to_create.append(website)
             
             if (i + 1) % 10 == 0:
-                print(f"  Подготовлено {i + 1} сайтов...")
+                logger.debug("Подготовлено %d сайтов...", i + 1)
         
         # Добавляем все сайты в базу
         session.add_all(websites_to_create)
@@ -118,12 +135,10 @@ async def seed_database():
         tcp_count = sum(1 for w in all_websites if w.protocol == ProtocolType.TCP)
         active_count = sum(1 for w in all_websites if w.is_active)
         
-        print(f"Загружено {len(all_websites)} демо-сайтов")
-        print(f"Статистика:")
-        print(f"   - {https_count} HTTP/HTTPS сайтов")
-        print(f"   - {tcp_count} TCP сервисов")
-        print(f"   - {active_count} активных, {len(all_websites) - active_count} неактивных")
-        print(f"   - Интервал проверки: 60 секунд")
+        logger.info(
+            "Загружено %d демо-сайтов", len(all_websites),
+            extra={"http": https_count, "tcp": tcp_count, "active": active_count, "check_interval": 60},
+        )
         
         return True
 
@@ -135,21 +150,19 @@ async def generate_initial_check_results():
     
     async with AsyncSessionLocal() as session:
         # Проверяем, есть ли уже результаты проверок
-        result = await session.execute(select(CheckResult))
-        existing_checks = result.scalars().all()
-        
-        if existing_checks:
-            print(f"В базе уже есть {len(existing_checks)} результатов проверок")
+        result = await session.execute(select(CheckResult.id).limit(1))
+        if result.first() is not None:
+            logger.info("В базе уже есть результаты проверок")
             return
         
-        print("Генерация начальной истории проверок...")
+        logger.info("Генерация начальной истории проверок...")
         
         # Получаем все сайты
         result = await session.execute(select(Website))
         websites = result.scalars().all()
         
         if not websites:
-            print("Нет сайтов для генерации проверок")
+            logger.info("Нет сайтов для генерации проверок")
             return
         
         check_results = []
@@ -187,96 +200,175 @@ async def generate_initial_check_results():
                 )
                 check_results.append(check_result)
         
-        session.add_all(check_results)
-        await session.commit()
-        
-        print(f"Сгенерировано {len(check_results)} исторических проверок")
-        print(f"Период: последние 24 часа")
+    # Пишем через общий writer, чтобы заполнились и агрегаты статистики
+    await result_writer.write(check_results)
+
+    logger.info("Сгенерировано %d исторических проверок за последние 24 часа", len(check_results))
+
+# Этапы запуска: отдаются в /health, пока сервис поднимается
+startup_state = {"ready": False, "started_at": None, "duration_ms": None, "stages": {}}
+_startup_task: Optional[asyncio.Task] = None
+
+
+async def run_stage(name: str, step, critical: bool = False):
+    stage = startup_state["stages"][name] = {"status": "running"}
+    started = time.perf_counter()
+    try:
+        result = step()
+        if inspect.isawaitable(result):
+            result = await result
+        stage["status"] = "done"
+        return result
+    except Exception as e:
+        stage.update(status="failed", error=str(e))
+        logger.error("Ошибка на этапе запуска %s: %s", name, e, extra={"stage": name})
+        if critical:
+            raise
+    finally:
+        stage["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def prepare_schema() -> None:
+    # create_all и миграции только при смене версии схемы
+    async with engine.begin() as conn:
+        changed = await conn.run_sync(ensure_schema)
+        # Состояние сайтов для подсчёта инцидентов — до первой записи проверок
+        await conn.run_sync(rollup_aggregator.load_state)
+    logger.info("Схема базы данных обновлена" if changed else "Схема базы данных актуальна")
+
+
+async def seed_demo_data() -> None:
+    db_seeded = await seed_database()
+    # Если база была заполнена, генерируем историю проверок
+    if db_seeded:
+        await generate_initial_check_results()
+
+
+async def start_nats() -> None:
+    if await connect_nats():
+        logger.info("NATS подключен")
+    else:
+        logger.warning("NATS пока не подключен: события сохраняются в outbox, подключение продолжается в фоне")
+
+
+async def start_checker() -> None:
+    # Общий HTTP-клиент для проверок и отложенная запись результатов
+    await start_http_client()
+    result_writer.start()
+    if settings.check_executor == "processes":
+        process_executor.start(settings.check_workers)
+    start_background_checker()
+    logger.info("Фоновая проверка сайтов запущена", extra={"executor": settings.check_executor})
+
+
+async def start_retention_stage() -> None:
+    # Очистка старой истории работает рядом с проверками
+    logger.info(start_retention())
+
+
+async def finish_startup(started: float) -> None:
+    # Независимые шаги идут одновременно: табло, NATS и проверки
+    await asyncio.gather(
+        run_stage("status_board", status_board.warm),
+        run_stage("nats", start_nats),
+        run_stage("checker", start_checker),
+    )
+
+    await run_stage("retention", start_retention_stage)
+
+    startup_state["ready"] = True
+    startup_state["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    # Итоговая информация
+    logger.info(
+        "Система мониторинга успешно запущена за %s мс", startup_state["duration_ms"],
+        extra={
+            "docs": "http://localhost:8000/docs",
+            "websocket": "ws://localhost:8000/ws/monitoring",
+            "database": settings.database_url,
+        },
+    )
+
 
 @app.on_event("startup")
 async def on_startup():
-    # Действия при запуске приложения
-    print("Запуск системы мониторинга сайтов...")
-    
-    # Создаем таблицы в базе данных
+    # Действия при запуске приложения: схема и данные — до приёма запросов,
+    # остальные этапы в фоне, их ход виден в /health
+    global _startup_task
+    setup_logging()
+    logger.info("Запуск системы мониторинга сайтов...")
+    started = time.perf_counter()
+    metrics.start_loop_monitor(settings.loop_lag_interval)
+    startup_state["started_at"] = datetime.utcnow().isoformat()
+
     try:
-        async with engine.begin() as conn:
-            await conn.run_sync(SQLModel.metadata.create_all)
-        print("Таблицы базы данных созданы")
-    except Exception as e:
-        print(f"Ошибка при создании таблиц БД: {e}")
+        await run_stage("schema", prepare_schema, critical=True)
+    except Exception:
         return
-    
-    # Заполняем базу демо-данными
-    try:
-        db_seeded = await seed_database()
-        
-        # Если база была заполнена, генерируем историю проверок
-        if db_seeded:
-            await generate_initial_check_results()
-    except Exception as e:
-        print(f"Ошибка при заполнении базы данных: {e}")
-        print("Приложение продолжит работу с пустой базой")
-    
-    # Подключаемся к NATS
-    try:
-        nats_connected = await connect_nats()
-        if nats_connected:
-            print("NATS подключен")
-        else:
-            print("NATS не подключен, работаем без него")
-    except Exception as e:
-        print(f"Ошибка подключения к NATS: {e}")
-    
-    # Запускаем фоновую проверку сайтов
+
     try:
-        start_background_checker()
-        print("Фоновая проверка сайтов запущена")
-        print("Интервал проверки: 60 секунд")
-    except Exception as e:
-        print(f"Ошибка запуска фоновой проверки: {e}")
-    
-    # Итоговая информация
-    print("\n" + "="*50)
-    print("Система мониторинга успешно запущена!")
-    print("="*50)
-    print("Доступные интерфейсы:")
-    print("   - REST API: http://localhost:8000/docs")
-    print("   - WebSocket: ws://localhost:8000/ws/monitoring")
-    print("   - База данных: monitoring.db (SQLite)")
-    print("\nДемо-данные:")
-    print("   - 30 сайтов для мониторинга")
-    print("   - Разные протоколы: HTTPS, HTTP, TCP")
-    print("   - История проверок за последние 24 часа")
-    print("="*50)
+        await run_stage("seed", seed_demo_data, critical=True)
+    except Exception:
+        logger.warning("Приложение продолжит работу с пустой базой")
+
+    _startup_task = asyncio.create_task(finish_startup(started))
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     # Действия при остановке приложения
-    print("\nОстановка системы мониторинга...")
+    logger.info("Остановка системы мониторинга...")
+
+    # Незаконченный запуск не должен стартовать задачи после их остановки
+    if _startup_task is not None and not _startup_task.done():
+        _startup_task.cancel()
+        try:
+            await _startup_task
+        except asyncio.CancelledError:
+            pass
+
+    await stop_background_checker()
+    await stop_retention()
+    await metrics.stop_loop_monitor()
+    await process_executor.stop()
     
     try:
         await close_nats()
-        print("NATS соединение закрыто")
     except Exception as e:
-        print(f"Ошибка при закрытии NATS: {e}")
+        logger.error("Ошибка при закрытии NATS: %s", e)
+
+    await close_http_client()
+
+    # Дописываем накопленные результаты проверок
+    try:
+        await result_writer.stop()
+        logger.info("Результаты проверок сохранены: %d", result_writer.written)
+    except Exception as e:
+        logger.error("Ошибка при сохранении результатов проверок: %s", e)
     
-    print("Система мониторинга остановлена")
+    logger.info("Система мониторинга остановлена")
+    stop_logging()
 
 
 # Подключаем роутеры
 app.include_router(websites_router)
 app.include_router(monitoring_router)
+app.include_router(stats_router)
 app.include_router(ws_monitoring_router)
 
 
 # Эндпоинт для проверки здоровья системы
 @app.get("/health")
 async def health_check():
-    # Проверка здоровья системы
-    return {
-        "status": "healthy",
+    # Проверка здоровья системы; пока запуск не завершён — 503
+    failed = [name for name, stage in startup_state["stages"].items() if stage["status"] == "failed"]
+    if not startup_state["ready"]:
+        status = "starting"
+    else:
+        status = "degraded" if failed else "healthy"
+    body = {
+        "status": status,
+        "ready": startup_state["ready"],
+        "startup": startup_state,
         "service": "Мониторинг Сайтов",
         "version": "Aльфа 0.1",
         "timestamp": datetime.utcnow().isoformat(),
@@ -284,9 +376,17 @@ async def health_check():
             "docs": "/docs",
             "websocket": "/ws/monitoring",
             "websites": "/websites",
-            "monitoring": "/monitoring"
+            "monitoring": "/monitoring",
+            "stats": "/stats"
         }
     }
+    return JSONResponse(body, status_code=200 if startup_state["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Метрики в текстовом формате Prometheus
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # Эндпоинт для получения информации о системе
@@ -302,7 +402,7 @@ async def root():
             "Поддержка HTTP, HTTPS и TCP протоколов",
             "Real-time уведомления через WebSocket",
             "REST API для управления",
-            "Фоновая проверка каждые 60 секунд",
+            "Фоновая проверка по интервалу каждого сайта",
             "История проверок с метриками"
         ],
         "quick_start": [
@@ -0,0 +1,257 @@
+import asyncio
+import bisect
+import math
+import time
+from typing import Callable, Iterable, Optional
+
+# Метрики в формате Prometheus (text exposition 0.0.4) без внешних пакетов.
+# Всё обновляется из одного event loop, поэтому блокировки не нужны:
+# inc() — это прибавление к полю, observe() — bisect по границам и два
+# прибавления. Счётчики, которые уже ведут сами компоненты (writer, NATS,
+# WebSocket), читаются функциями-коллбеками только в момент запроса /metrics.
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._children: dict[LabelValues, object] = {}
+        self._function: Optional[Callable] = None
+
+    def labels(self, *values) -> object:
+        # Дочерний объект кэшируется: на горячем пути это один поиск в dict
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def set_function(self, function: Callable) -> "_Metric":
+        # Значение вычисляется при сборе. Для метрик с метками функция
+        # возвращает пары (значения меток, значение)
+        self._function = function
+        return self
+
+    def _samples(self) -> Iterable[tuple[LabelValues, float]]:
+        if self._function is not None:
+            result = self._function()
+            if self.labelnames:
+                return [(tuple(str(v) for v in labels), value) for labels, value in result]
+            return [((), result)]
+        return [(key, child.value) for key, child in self._children.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: list[float]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: Iterable[float] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = sorted(buckets)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{label_str} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: Iterable[float] = ()) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Сломанный коллбек не должен ронять весь /metrics
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Проверки
+check_duration = registry.histogram(
+    "monitoring_check_duration_seconds", "Длительность проверки сайта",
+    ("protocol", "outcome"), LATENCY_BUCKETS,
+)
+cycle_duration = registry.histogram(
+    "monitoring_check_cycle_duration_seconds", "Длительность ручного цикла проверки всех сайтов",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+schedule_lag = registry.histogram(
+    "monitoring_schedule_lag_seconds", "Опоздание запуска проверки относительно расписания",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 15, 60),
+)
+checks_in_flight = registry.gauge("monitoring_checks_in_flight", "Проверок выполняется сейчас")
+scheduled_sites = registry.gauge("monitoring_scheduled_sites", "Сайтов в расписании")
+checks_skipped = registry.counter(
+    "monitoring_checks_skipped_total", "Проверок пропущено из-за открытого circuit breaker"
+)
+
+# Запись в базу
+db_flush_duration = registry.histogram(
+    "monitoring_db_flush_duration_seconds", "Длительность записи пачки результатов",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+db_rows_written = registry.counter("monitoring_db_rows_written_total", "Записано результатов проверок")
+db_rows_dropped = registry.counter("monitoring_db_rows_dropped_total", "Потеряно результатов после ошибок записи")
+db_queue_depth = registry.gauge("monitoring_db_write_queue_depth", "Результатов в очереди на запись")
+
+# WebSocket
+ws_connections = registry.gauge("monitoring_ws_connections", "Подключённых WebSocket-клиентов")
+ws_client_queue = registry.gauge(
+    "monitoring_ws_client_queue_depth", "Сообщений в очереди отправки клиента", ("client",)
+)
+ws_dropped = registry.counter("monitoring_ws_dropped_total", "Сообщений отброшено для медленных клиентов")
+
+# NATS
+nats_events = registry.counter("monitoring_nats_events_published_total", "Событий опубликовано в NATS")
+nats_batches = registry.counter("monitoring_nats_batches_published_total", "Пачек опубликовано в NATS")
+nats_errors = registry.counter("monitoring_nats_publish_errors_total", "Ошибок публикации в NATS")
+nats_outbox = registry.gauge("monitoring_nats_outbox_depth", "Событий в outbox до переотправки")
+nats_connected = registry.gauge("monitoring_nats_connected", "1, если соединение с NATS установлено")
+
+# Event loop
+loop_lag = registry.histogram(
+    "monitoring_event_loop_lag_seconds", "Задержка пробуждения event loop сверх запрошенной",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+loop_lag_last = registry.gauge("monitoring_event_loop_lag_last_seconds", "Последняя измеренная задержка event loop")
+
+_lag_task: Optional[asyncio.Task] = None
+
+
+async def _loop_lag_monitor(interval: float) -> None:
+    # Просим проснуться через interval и меряем, насколько позже это случилось
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(time.perf_counter() - started - interval, 0.0)
+        loop_lag.observe(lag)
+        loop_lag_last.set(lag)
+
+
+def start_loop_monitor(interval: float) -> None:
+    global _lag_task
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.get_event_loop().create_task(_loop_lag_monitor(interval))
+
+
+async def stop_loop_monitor() -> None:
+    global _lag_task
+    if _lag_task and not _lag_task.done():
+        _lag_task.cancel()
+        try:
+            await _lag_task
+        except asyncio.CancelledError:
+            pass
+    _lag_task = None
@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -9,9 +10,23 @@ class CheckResultBase(SQLModel):
     status_code: Optional[int] = None
     response_time: Optional[float] = None  # в миллисекундах
     error_message: Optional[str] = None
+    # Фазы запроса в миллисекундах (0 при переиспользованном соединении
+    # и при попадании в кэш DNS)
+    dns_time: Optional[float] = None
+    connect_time: Optional[float] = None
+    tls_time: Optional[float] = None
+    ttfb: Optional[float] = None
+    # PING: потери в процентах и джиттер RTT в миллисекундах
+    packet_loss: Optional[float] = None
+    jitter: Optional[float] = None
 
 
 class CheckResult(CheckResultBase, table=True):
+    # История проверок сайта: WHERE website_id = ? ORDER BY checked_at DESC
+    __table_args__ = (
+        Index("ix_checkresult_website_checked", "website_id", "checked_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     website_id: int = Field(foreign_key="website.id")
     checked_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,18 @@
+from __future__ import annotations
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class CheckRollup(SQLModel, table=True):
+    # Агрегат проверок сайта за корзину времени (минута, час или сутки)
+    website_id: int = Field(foreign_key="website.id", primary_key=True)
+    resolution: int = Field(primary_key=True)  # размер корзины в секундах
+    bucket_start: datetime = Field(primary_key=True)
+    count: int = 0
+    up_count: int = 0
+    incidents: int = 0  # переходы из "работает" в "не работает"
+    latency_sum: float = 0.0  # по успешным проверкам, мс
+    latency_max: Optional[float] = None
+    latency_count: Optional[int] = None  # число проверок с задержкой (знаменатель среднего)
+    histogram: str = ""  # "индекс:количество,..." по логарифмической шкале задержек
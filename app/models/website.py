@@ -1,6 +1,8 @@
 from __future__ import annotations
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+from pydantic import field_validator
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from enum import Enum
 
@@ -21,6 +23,11 @@ class WebsiteBase(SQLModel):
 
 
 class Website(WebsiteBase, table=True):
+    # Поиск дубликатов по URL при создании сайта
+    __table_args__ = (
+        Index("ix_website_url", "url", unique=True),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -35,4 +42,20 @@ class WebsiteUpdate(SQLModel):
     url: Optional[str] = None
     protocol: Optional[ProtocolType] = None
     check_interval: Optional[int] = None
-    is_active: Optional[bool] = None
\ No newline at end of file
+    is_active: Optional[bool] = None
+
+    # Поле можно не передавать, но явный null в NOT NULL колонку — ошибка запроса
+    @field_validator("name", "url", "protocol", "check_interval", "is_active")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("field cannot be null")
+        return value
+
+
+class WebsiteBulkUpdate(WebsiteUpdate):
+    id: int
+
+
+class WebsiteIds(SQLModel):
+    ids: List[int]
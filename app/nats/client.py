@@ -1,72 +1,308 @@
-import json
+import asyncio
+import logging
+import time
+import zlib
+from typing import Optional
+
 import nats
+from app import metrics
+from app.config import settings
+from app.nats.outbox import Outbox
+from app.serialization import dumps, loads
 from app.ws.manager import ws_manager
 
-NATS_URL = "nats://127.0.0.1:4222"
-SUBJECT = "monitoring.events"
+logger = logging.getLogger(__name__)
+
+NATS_URL = settings.nats_url
+SUBJECT = settings.nats_subject
 
 connection = None
 is_connected = False
+_connect_task: Optional[asyncio.Task] = None
 
-async def connect_nats():
-    global connection, is_connected
 
-    try:
-        connection = await nats.connect(NATS_URL, connect_timeout=2)
-        is_connected = True
-        print("NATS подключен")
+class NatsPublisher:
+    # Публикация пачками: события копятся в буфере и уходят одним сообщением
+    # по размеру или по времени. Без соединения события пишутся в outbox
+    # на диске и после переподключения отправляются в исходном порядке.
+    def __init__(self) -> None:
+        self._buffer: list[tuple[float, bytes]] = []
+        self._buffer_bytes = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._replaying = False
+        self.outbox = Outbox(settings.nats_outbox_path, settings.nats_outbox_max)
+        self.events_published = 0
+        self.batches_published = 0
+        self.events_replayed = 0
+        self.bytes_raw = 0
+        self.bytes_sent = 0
+        self.errors = 0
+        self.lag_max_ms = 0.0
+        self._lag_total_ms = 0.0
+        self.started_at = time.monotonic()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self) -> None:
+        self._wakeup.set()
 
-        async def handler(msg):
+    async def publish(self, event: dict) -> bool:
+        data = dumps(event)
+        if not self.outbox.loaded:
+            # До чтения outbox его depth равен 0 — после перезапуска новые
+            # события обогнали бы сохранённые
+            await self.outbox.load()
+        # Пока в outbox есть хвост, новые события встают за ним
+        if is_connected and not self._replaying and self.outbox.depth == 0:
+            self._buffer.append((time.monotonic(), data))
+            self._buffer_bytes += len(data)
+            if (len(self._buffer) >= settings.nats_batch_max_events
+                    or self._buffer_bytes >= settings.nats_batch_max_bytes):
+                self._wakeup.set()
+            return True
+        await self.outbox.append([data])
+        return False
+
+    async def _run(self) -> None:
+        await self.outbox.load()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.nats_batch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
             try:
-                data = json.loads(msg.data.decode())
-                print(f"NATS получено: {data}")
-                
-                # Рассылаем всем WebSocket клиентам
-                await ws_manager.broadcast_json({
-                    "type": "nats.inbound",
-                    "subject": msg.subject,
-                    "payload": data
-                })
-                
+                if self._buffer:
+                    await self._flush_buffer()
+                if is_connected and self.outbox.depth and not self._replaying:
+                    await self._replay()
             except Exception as e:
-                print(f"Ошибка обработки NATS сообщения: {e}")
-                await ws_manager.broadcast_json({
-                    "type": "nats.error",
-                    "error": str(e),
-                    "raw_data": msg.data.decode(errors="ignore")
-                })
-
-        await connection.subscribe(SUBJECT, cb=handler)
-        print(f"Подписан на тему: {SUBJECT}")
-        return True
-        
+                self.errors += 1
+                logger.error("Ошибка публикации в NATS: %s", e)
+
+    async def _send(self, items: list[bytes], replayed: bool = False) -> None:
+        body = b'{"batch":[' + b",".join(items) + b"]}"
+        headers = {"Batch-Size": str(len(items))}
+        self.bytes_raw += len(body)
+        if settings.nats_compression and len(body) >= settings.nats_compress_min_bytes:
+            body = zlib.compress(body, 6)
+            headers["Content-Encoding"] = "deflate"
+        if replayed:
+            headers["Replayed"] = "1"
+        await connection.publish(SUBJECT, body, headers=headers)
+        self.bytes_sent += len(body)
+        self.batches_published += 1
+
+    async def _flush_buffer(self) -> None:
+        items, self._buffer, self._buffer_bytes = self._buffer, [], 0
+        for i in range(0, len(items), settings.nats_batch_max_events):
+            chunk = items[i:i + settings.nats_batch_max_events]
+            try:
+                if not is_connected or connection is None:
+                    raise ConnectionError("NATS не подключен")
+                await self._send([data for _, data in chunk])
+            except Exception as e:
+                # Не потеряли: пачка уходит в outbox и будет переотправлена
+                self.errors += 1
+                logger.warning("Ошибка публикации в NATS (%s), %d событий сохранено в outbox", e, len(chunk))
+                await self.outbox.append([data for _, data in chunk])
+                continue
+            now = time.monotonic()
+            lag = (now - chunk[0][0]) * 1000
+            self.lag_max_ms = max(self.lag_max_ms, lag)
+            self._lag_total_ms += lag
+            self.events_published += len(chunk)
+
+    async def _replay(self) -> None:
+        self._replaying = True
+        try:
+            while is_connected and connection is not None:
+                rows = await self.outbox.peek(settings.nats_batch_max_events)
+                if not rows:
+                    break
+                await self._send([data for _, data in rows], replayed=True)
+                # Удаляем из outbox только после подтверждения сервером
+                await connection.flush(timeout=5)
+                await self.outbox.ack(rows[-1][0])
+                self.events_replayed += len(rows)
+                self.events_published += len(rows)
+            if self.events_replayed:
+                logger.info("NATS: outbox отправлен, всего переотправлено %d событий", self.events_replayed)
+        finally:
+            self._replaying = False
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Остаток буфера — в NATS, если можем, иначе на диск
+        if self._buffer:
+            await self._flush_buffer()
+        self.outbox.close()
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        batches = self.batches_published
+        return {
+            "connected": is_connected,
+            "events_published": self.events_published,
+            "batches_published": batches,
+            "events_per_second": round(self.events_published / elapsed, 2),
+            "avg_batch_size": round(self.events_published / batches, 2) if batches else 0,
+            "bytes_raw": self.bytes_raw,
+            "bytes_sent": self.bytes_sent,
+            "errors": self.errors,
+            "buffered": len(self._buffer),
+            "outbox_depth": self.outbox.depth,
+            "outbox_dropped": self.outbox.dropped,
+            "outbox_lag_s": round(time.time() - self.outbox.oldest_ts, 1) if self.outbox.oldest_ts else 0.0,
+            "events_replayed": self.events_replayed,
+            "publish_lag_avg_ms": round(self._lag_total_ms / max(self.events_published - self.events_replayed, 1), 2),
+            "publish_lag_max_ms": round(self.lag_max_ms, 2),
+        }
+
+
+publisher = NatsPublisher()
+
+metrics.nats_events.set_function(lambda: publisher.events_published)
+metrics.nats_batches.set_function(lambda: publisher.batches_published)
+metrics.nats_errors.set_function(lambda: publisher.errors)
+metrics.nats_outbox.set_function(lambda: publisher.outbox.depth)
+metrics.nats_connected.set_function(lambda: 1 if is_connected else 0)
+
+
+async def handler(msg):
+    try:
+        headers = msg.headers or {}
+        body = msg.data
+        if headers.get("Content-Encoding") == "deflate":
+            body = zlib.decompress(body)
+        data = loads(body)
+        # Пачка от нашего publisher'а или одиночное событие от внешнего клиента
+        if isinstance(data, dict) and isinstance(data.get("batch"), list):
+            events = data["batch"]
+        else:
+            events = [data]
+        logger.debug("NATS получено: %d событий", len(events), extra={"subject": msg.subject})
+
+        # Рассылаем всем WebSocket клиентам
+        for event in events:
+            inbound = {
+                "type": "nats.inbound",
+                "subject": msg.subject,
+                "payload": event
+            }
+            if headers.get("Replayed"):
+                inbound["replayed"] = True
+            await ws_manager.broadcast_json(inbound)
+
     except Exception as e:
-        print(f"NATS: ошибка подключения ({e})")
-        is_connected = False
-        connection = None
-        return False
+        logger.error("Ошибка обработки NATS сообщения: %s", e, extra={"subject": msg.subject})
+        await ws_manager.broadcast_json({
+            "type": "nats.error",
+            "error": str(e),
+            "raw_data": msg.data.decode(errors="ignore")
+        })
 
 
-async def close_nats():
+async def _on_disconnected():
+    global is_connected
+    is_connected = False
+    logger.warning("NATS: соединение потеряно, события пишутся в outbox")
+
+
+async def _on_reconnected():
+    global is_connected
+    is_connected = True
+    logger.info("NATS: соединение восстановлено")
+    publisher.wake()
+
+
+_last_error: Optional[str] = None
+
+
+async def _on_error(e):
+    # Повторяющиеся ошибки переподключения не печатаем каждый раз
+    global _last_error
+    publisher.errors += 1
+    if str(e) != _last_error:
+        _last_error = str(e)
+        logger.warning("NATS: ошибка соединения (%s)", e)
+
+
+async def _connection_loop():
     global connection, is_connected
+    while True:
+        try:
+            # max_reconnect_attempts=-1: клиент сам переподключается бесконечно,
+            # в том числе при первом подключении
+            nc = await nats.connect(
+                NATS_URL,
+                connect_timeout=2,
+                allow_reconnect=True,
+                max_reconnect_attempts=-1,
+                reconnect_time_wait=settings.nats_reconnect_wait,
+                disconnected_cb=_on_disconnected,
+                reconnected_cb=_on_reconnected,
+                error_cb=_on_error,
+            )
+            await nc.subscribe(SUBJECT, cb=handler)
+            connection = nc
+            is_connected = True
+            logger.info("NATS подключен, подписан на тему: %s", SUBJECT)
+            publisher.wake()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("NATS: ошибка подключения (%s)", e)
+            await asyncio.sleep(settings.nats_reconnect_wait)
+
+
+async def connect_nats():
+    # Подключение идёт в фоне; ждём его недолго, чтобы не задерживать старт
+    global _connect_task
+    # Хвост outbox с прошлого запуска читаем до подключения и первых публикаций
+    await publisher.outbox.load()
+    publisher.start()
+    if _connect_task is None or _connect_task.done():
+        _connect_task = asyncio.create_task(_connection_loop())
+    try:
+        await asyncio.wait_for(asyncio.shield(_connect_task), timeout=settings.nats_connect_wait)
+    except asyncio.TimeoutError:
+        pass
+    return is_connected
+
+
+async def close_nats():
+    global connection, is_connected, _connect_task
+    if _connect_task is not None and not _connect_task.done():
+        _connect_task.cancel()
+    _connect_task = None
+    await publisher.stop()
     if connection is not None:
         try:
             await connection.drain()
-            print("NATS соединение закрыто")
+            logger.info("NATS соединение закрыто")
         except Exception as e:
-            print(f"Ошибка при закрытии NATS: {e}")
+            logger.error("Ошибка при закрытии NATS: %s", e)
     connection = None
     is_connected = False
 
 
 async def publish_event(event: dict):
-    # Публикация события в NATS
-    if not is_connected or connection is None:
-        return False
+    # True — событие уйдёт через NATS (и вернётся в WebSocket через подписку),
+    # False — NATS недоступен: событие сохранено в outbox, вызывающий
+    # сам рассылает его в WebSocket
     try:
-        await connection.publish(SUBJECT, json.dumps(event, default=str).encode())
-        print(f"Опубликовано в NATS: {event['type']}")
-        return True
+        return await publisher.publish(event)
     except Exception as e:
-        print(f"Ошибка публикации в NATS: {e}")
-        return False
\ No newline at end of file
+        logger.error("Ошибка публикации в NATS: %s", e)
+        return False
@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+import time
+from typing import Optional
+
+
+class Outbox:
+    # Локальная очередь событий на диске (SQLite) на время отсутствия NATS.
+    # Порядок сохраняется по автоинкрементному id; при переполнении
+    # вытесняются самые старые события.
+    def __init__(self, path: str, max_events: int) -> None:
+        self.path = path
+        self.max_events = max_events
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = asyncio.Lock()
+        self.depth = 0
+        self.dropped = 0
+        self.oldest_ts: Optional[float] = None
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, data BLOB NOT NULL)"
+            )
+            self._conn = conn
+            self._refresh()
+        return self._conn
+
+    @property
+    def loaded(self) -> bool:
+        return self._conn is not None
+
+    def _refresh(self) -> None:
+        count, oldest = self._conn.execute("SELECT count(*), min(created) FROM outbox").fetchone()
+        self.depth = count
+        self.oldest_ts = oldest
+
+    def _append(self, items: list[bytes]) -> None:
+        conn = self._open()
+        now = time.time()
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO outbox (created, data) VALUES (?, ?)", [(now, d) for d in items])
+        overflow = self.depth + len(items) - self.max_events
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM outbox WHERE id IN (SELECT id FROM outbox ORDER BY id LIMIT ?)", (overflow,)
+            )
+            self.dropped += overflow
+        conn.execute("COMMIT")
+        self._refresh()
+
+    def _peek(self, limit: int) -> list[tuple[int, bytes]]:
+        return self._open().execute(
+            "SELECT id, data FROM outbox ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+
+    def _ack(self, last_id: int) -> None:
+        self._open().execute("DELETE FROM outbox WHERE id <= ?", (last_id,))
+        self._refresh()
+
+    async def append(self, items: list[bytes]) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._append, items)
+
+    async def peek(self, limit: int) -> list[tuple[int, bytes]]:
+        async with self._lock:
+            return await asyncio.to_thread(self._peek, limit)
+
+    async def ack(self, last_id: int) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._ack, last_id)
+
+    async def load(self) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self._open)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
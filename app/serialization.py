@@ -0,0 +1,53 @@
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+# Единая сериализация ответов API, сообщений WebSocket и событий NATS.
+# orjson сам кодирует datetime, Enum, dataclass и работает на порядок
+# быстрее json + jsonable_encoder; без него используется stdlib json
+# с тем же выводом (компактный, UTF-8 без \u-экранирования).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    # Типы, которые не умеет кодировать сам сериализатор
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+def dumps_str(value: Any) -> str:
+    # Для WebSocket send_text
+    return dumps(value).decode()
+
+
+class FastJSONResponse(JSONResponse):
+    # Класс ответа по умолчанию. Если вернуть его из роута напрямую,
+    # FastAPI не прогоняет данные через response_model повторно
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
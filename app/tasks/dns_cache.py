@@ -0,0 +1,138 @@
+import asyncio
+import ipaddress
+import socket
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+import httpcore
+
+from app.config import settings
+
+# Кэш DNS для проверок: getaddrinfo уходит в пул потоков и под нагрузкой
+# становится узким местом, а его время попадает в response_time.
+# Один кэш используют и HTTP-транспорт, и TCP-проверки. Одновременные
+# запросы одного имени ждут общий результат, ошибки тоже кэшируются
+# (на более короткий срок), размер ограничен — вытесняются давние записи.
+
+# Куда прибавлять время резолва текущей проверки (PhaseTimer)
+dns_timer: ContextVar[Optional[object]] = ContextVar("dns_timer", default=None)
+
+
+class DNSCache:
+    def __init__(self, ttl: float, negative_ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()  # хост -> (истекает, адреса | ошибка)
+        self._pending: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def _lookup(self, host: str) -> list[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, None, type=socket.SOCK_STREAM
+        )
+        # Порядок getaddrinfo сохраняем, дубли убираем
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+    async def resolve(self, host: str) -> tuple[list[str], float]:
+        # Возвращает адреса и время резолва в мс (0 для попадания в кэш)
+        try:
+            ipaddress.ip_address(host)
+            return [host], 0.0
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        entry = self._entries.get(host)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(host)
+            self.hits += 1
+            if isinstance(entry[1], Exception):
+                raise type(entry[1])(*entry[1].args)
+            return entry[1], 0.0
+
+        start = time.perf_counter()
+        task = self._pending.get(host)
+        if task is None:
+            self.misses += 1
+            # Резолв — отдельная задача: отмена одной проверки не оставит
+            # без ответа остальных, ждущих то же имя
+            task = asyncio.ensure_future(self._fill(host))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._pending[host] = task
+        addresses = await asyncio.shield(task)
+        return addresses, (time.perf_counter() - start) * 1000
+
+    async def _fill(self, host: str) -> list[str]:
+        try:
+            addresses = await self._lookup(host)
+        except Exception as e:
+            self._store(host, self.negative_ttl, e)
+            raise
+        else:
+            self._store(host, self.ttl, addresses)
+            return addresses
+        finally:
+            self._pending.pop(host, None)
+
+    def _store(self, host: str, ttl: float, value: object) -> None:
+        if ttl <= 0:
+            return
+        self._entries[host] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(host)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+dns_cache = DNSCache(settings.dns_cache_ttl, settings.dns_negative_ttl, settings.dns_cache_size)
+
+
+async def resolve_timed(host: str) -> list[str]:
+    # Резолв с записью времени в таймер текущей проверки
+    timer = dns_timer.get()
+    start = time.perf_counter()
+    try:
+        addresses, elapsed = await dns_cache.resolve(host)
+    except Exception:
+        # Неудачный резолв тоже относим к DNS, а не к подключению
+        if timer is not None:
+            timer.dns_time += (time.perf_counter() - start) * 1000
+        raise
+    if timer is not None:
+        timer.dns_time += elapsed
+    return addresses
+
+
+class CachingNetworkBackend(httpcore.AsyncNetworkBackend):
+    # Сетевой бэкенд httpcore: имя резолвим через кэш, подключаемся по IP.
+    # SNI и заголовок Host httpcore берёт из URL, а не из адреса подключения.
+    def __init__(self) -> None:
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addresses = await resolve_timed(host)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout,
+                    local_address=local_address, socket_options=socket_options,
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpcore.ConnectError(f"no addresses for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
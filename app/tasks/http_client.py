@@ -0,0 +1,178 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Optional
+import httpcore
+import httpx
+
+from app.config import settings
+from app.tasks.dns_cache import CachingNetworkBackend
+
+logger = logging.getLogger(__name__)
+
+# Общий HTTP-клиент проверок: один пул соединений на всё приложение
+_client: Optional[httpx.AsyncClient] = None
+
+# Исключения httpcore -> httpx (подклассы раньше базовых), как в httpx.AsyncHTTPTransport
+_ERRORS = [
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+]
+
+
+@contextmanager
+def _map_errors():
+    try:
+        yield
+    except Exception as e:
+        for source, target in _ERRORS:
+            if isinstance(e, source):
+                raise target(str(e)) from e
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream) -> None:
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _map_errors():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, "aclose"):
+            await self._stream.aclose()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    # Транспорт поверх собственного пула httpcore: в httpx нельзя передать
+    # сетевой бэкенд, а пулу httpcore — можно, через публичный параметр
+    def __init__(self, limits: httpx.Limits, http2: bool) -> None:
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachingNetworkBackend(),
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _map_errors():
+            response = await self._pool.handle_async_request(core_request)
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=_ResponseStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._pool.aclose()
+
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 отключён: пакет h2 не установлен (pip install httpx[http2])")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    return httpx.AsyncClient(
+        timeout=settings.http_timeout,
+        transport=CachingTransport(limits, http2),
+        follow_redirects=True,
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # Клиент создаётся на старте приложения, но отдельные вызовы
+    # (например, из скриптов) получат его и без этого
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+
+
+class PhaseTimer:
+    # Разбивка времени запроса на фазы через trace-хуки httpcore.
+    # При переиспользовании соединения connect/TLS равны нулю,
+    # а ttfb остаётся сопоставимым между проверками.
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.dns_time = 0.0
+        self.connect_time = 0.0
+        self.tls_time = 0.0
+        self.ttfb: Optional[float] = None
+        self._marks: dict[str, float] = {}
+
+    async def trace(self, event_name: str, info: dict) -> None:
+        now = time.perf_counter()
+        phase, _, stage = event_name.rpartition(".")
+        phase = phase.rpartition(".")[2]
+        if stage == "started":
+            self._marks[phase] = now
+        elif stage == "complete":
+            began = self._marks.pop(phase, now)
+            if phase == "connect_tcp":
+                self.connect_time += (now - began) * 1000
+            elif phase == "start_tls":
+                self.tls_time += (now - began) * 1000
+            elif phase == "receive_response_headers":
+                # Для редиректов берём время до заголовков последнего ответа
+                self.ttfb = (now - self.start) * 1000
+
+    def as_dict(self) -> dict:
+        # Резолв идёт внутри connect_tcp — вычитаем его из подключения
+        return {
+            "dns_time": round(self.dns_time, 3),
+            "connect_time": round(max(self.connect_time - self.dns_time, 0.0), 3),
+            "tls_time": round(self.tls_time, 3),
+            "ttfb": round(self.ttfb, 3) if self.ttfb is not None else None,
+        }
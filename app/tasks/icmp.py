@@ -0,0 +1,201 @@
+import asyncio
+import os
+import socket
+import statistics
+import struct
+import time
+from typing import Optional
+
+from app.config import settings
+from app.tasks.dns_cache import dns_cache
+
+# ICMP echo (PING) для проверок. Один сокет на процесс обслуживает все
+# цели сразу: ответы сопоставляются с запросами по номеру последовательности,
+# поэтому сотни хостов пингуются из одной корутины без потоков.
+# Сначала пробуем непривилегированный датаграммный сокет (Linux,
+# net.ipv4.ping_group_range), под root — raw-сокет.
+#
+#   python -m app.tasks.icmp 127.0.0.1 [--count N]
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class IcmpPinger:
+    def __init__(self) -> None:
+        self._sock: Optional[socket.socket] = None
+        self._raw = False
+        self._identifier = os.getpid() & 0xFFFF
+        self._sequence = 0
+        # последовательность -> (адрес, время отправки, future)
+        self._pending: dict[int, tuple[str, float, asyncio.Future]] = {}
+        self.sent = 0
+        self.received = 0
+
+    def _open(self) -> socket.socket:
+        if self._sock is not None:
+            return self._sock
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self._raw = False
+        except PermissionError:
+            # ping_group_range не включает нашу группу — остаётся raw-сокет (root)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self._raw = True
+        sock.setblocking(False)
+        # Ответы сотен целей приходят пачкой — запас в буфере приёма
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        self._sock = sock
+        return sock
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(self._sock.fileno())
+            except RuntimeError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+    def _next_sequence(self) -> int:
+        for _ in range(0x10000):
+            self._sequence = (self._sequence + 1) & 0xFFFF
+            if self._sequence not in self._pending:
+                return self._sequence
+        raise RuntimeError("все номера ICMP заняты")
+
+    def _on_readable(self) -> None:
+        # Разбираем всё, что накопилось в сокете, за один вызов
+        while True:
+            try:
+                packet, (address, _) = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            received_at = time.perf_counter()
+            if self._raw:
+                packet = packet[(packet[0] & 0x0F) * 4:]
+            if len(packet) < 8:
+                continue
+            icmp_type, _, _, identifier, sequence = struct.unpack("!BBHHH", packet[:8])
+            # Датаграммному сокету ядро само подставляет идентификатор и
+            # отдаёт только свои ответы; raw-сокет видит все ICMP на хосте
+            if icmp_type != ICMP_ECHO_REPLY or (self._raw and identifier != self._identifier):
+                continue
+            entry = self._pending.get(sequence)
+            if entry is None or entry[0] != address or entry[2].done():
+                continue
+            self.received += 1
+            entry[2].set_result((received_at - entry[1]) * 1000)
+
+    async def echo(self, address: str, timeout: float) -> Optional[float]:
+        # Один запрос: RTT в мс или None при потере
+        sock = self._open()
+        sequence = self._next_sequence()
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self._identifier, sequence)
+        payload = b"monitoring-ping".ljust(32, b"\0")
+        packet = struct.pack(
+            "!BBHHH", ICMP_ECHO_REQUEST, 0, checksum(header + payload), self._identifier, sequence
+        ) + payload
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[sequence] = (address, time.perf_counter(), future)
+        try:
+            await loop.sock_sendto(sock, packet, (address, 0))
+            self.sent += 1
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._pending.pop(sequence, None)
+
+    async def ping(self, host: str, count: int, interval: float, timeout: float) -> dict:
+        addresses, dns_time = await dns_cache.resolve(host)
+        address = next((a for a in addresses if ":" not in a), None)
+        if address is None:
+            raise OSError(f"нет IPv4-адреса для {host}")
+
+        # Запросы уходят с интервалом, а ответы ждутся параллельно
+        probes = []
+        for index in range(count):
+            if index:
+                await asyncio.sleep(interval)
+            probes.append(asyncio.ensure_future(self.echo(address, timeout)))
+        rtts = [rtt for rtt in await asyncio.gather(*probes) if rtt is not None]
+
+        return {
+            "address": address,
+            "dns_time": round(dns_time, 3),
+            "sent": count,
+            "received": len(rtts),
+            "packet_loss": round((count - len(rtts)) / count * 100, 1),
+            "rtt_avg": round(statistics.fmean(rtts), 3) if rtts else None,
+            "rtt_min": round(min(rtts), 3) if rtts else None,
+            "rtt_max": round(max(rtts), 3) if rtts else None,
+            # Джиттер — среднее изменение RTT между соседними ответами
+            "jitter": round(statistics.fmean(abs(b - a) for a, b in zip(rtts, rtts[1:])), 3)
+            if len(rtts) > 1 else None,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "socket": None if self._sock is None else ("raw" if self._raw else "dgram"),
+            "sent": self.sent,
+            "received": self.received,
+            "in_flight": len(self._pending),
+        }
+
+
+pinger = IcmpPinger()
+
+
+async def check_ping(host: str, timeout: Optional[float] = None) -> tuple[bool, Optional[int], float, dict]:
+    # timeout — ожидание каждого echo-ответа (адаптивный от ProbePolicy)
+    timeout = timeout or settings.ping_timeout
+    start = time.perf_counter()
+    try:
+        result = await pinger.ping(host, settings.ping_count, settings.ping_interval, timeout)
+    except OSError as e:
+        latency = (time.perf_counter() - start) * 1000
+        return False, None, latency, {"packet_loss": 100.0, "error_message": f"ICMP: {e}"}
+
+    phases = {
+        "dns_time": result["dns_time"],
+        "packet_loss": result["packet_loss"],
+        "jitter": result["jitter"],
+    }
+    if not result["received"]:
+        phases["error_message"] = "Нет ответа на ICMP echo"
+        return False, None, timeout * 1000, phases
+    return True, None, result["rtt_avg"], phases
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Проверка ICMP echo (по умолчанию — loopback)")
+    parser.add_argument("host", nargs="?", default="127.0.0.1")
+    parser.add_argument("--count", type=int, default=settings.ping_count)
+    parser.add_argument("--interval", type=float, default=settings.ping_interval)
+    parser.add_argument("--timeout", type=float, default=settings.ping_timeout)
+    args = parser.parse_args()
+
+    async def main() -> None:
+        result = await pinger.ping(args.host, args.count, args.interval, args.timeout)
+        print(json.dumps({**result, "socket": pinger.stats()["socket"]}, ensure_ascii=False, indent=2))
+        pinger.close()
+
+    asyncio.run(main())
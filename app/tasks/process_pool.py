@@ -0,0 +1,236 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import signal
+from multiprocessing.connection import Connection
+from typing import Awaitable, Callable, Optional
+
+from app.config import settings
+from app.models.website import Website
+
+logger = logging.getLogger(__name__)
+
+# Проверки в нескольких процессах на одной машине (CHECK_EXECUTOR=processes).
+# Планирование, запись результатов и рассылка событий остаются в основном
+# процессе; TLS-рукопожатия и разбор ответов уходят в дочерние процессы,
+# у каждого свой event loop и свой пул соединений. Сайт закрепляется за
+# процессом по consistent hashing id, поэтому keep-alive соединения к нему
+# переиспользуются, а при падении процесса переезжают только его сайты.
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: list[int], replicas: int = 64) -> None:
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._owners: list[int] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"worker-{node}-{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: int) -> None:
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, website_id: int) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(f"site-{website_id}")) % len(self._points)
+        return self._owners[index]
+
+
+class PipeSender:
+    # Connection.send блокируется, пока другая сторона не вычитает pipe
+    # (большое сообщение или занятый получатель) — в event loop это встало бы
+    # вместе со всеми проверками. Отправляем в потоке и по одному сообщению,
+    # чтобы байты разных сообщений не перемешались.
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+        self._lock = asyncio.Lock()
+
+    async def send(self, message) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self.conn.send, message)
+
+
+def _child_main(conn: Connection, index: int) -> None:
+    # Ctrl+C получает основной процесс и сам останавливает дочерние
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    from app.log import setup_logging
+    setup_logging()
+    asyncio.run(_child_loop(conn))
+
+
+async def _child_loop(conn: Connection) -> None:
+    from app.tasks.http_client import close_http_client, start_http_client
+    from app.tasks.site_checker import probe_website
+
+    await start_http_client()
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    tasks: set[asyncio.Task] = set()
+    sender = PipeSender(conn)
+
+    async def run_job(job_id: int, website: Website, timeout: Optional[float]) -> None:
+        try:
+            result = (job_id, await probe_website(website, timeout), None)
+        except Exception as e:
+            result = (job_id, None, str(e))
+        await sender.send(result)
+
+    def on_readable() -> None:
+        try:
+            message = conn.recv()
+        except EOFError:
+            message = None
+        if message is None:
+            loop.remove_reader(conn.fileno())
+            stop.set()
+            return
+        job_id, data, timeout = message
+        task = loop.create_task(run_job(job_id, Website(**data), timeout))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    loop.add_reader(conn.fileno(), on_readable)
+    await stop.wait()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await close_http_client()
+    conn.close()
+
+
+class ProcessExecutor:
+    def __init__(self) -> None:
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self._conns: dict[int, Connection] = {}
+        self._senders: dict[int, PipeSender] = {}
+        self._pending: dict[int, tuple[int, asyncio.Future]] = {}  # job -> (процесс, future)
+        self._ring = HashRing([])
+        self._next_job = 0
+        self._stopping = False
+        self.stats = {"dispatched": 0, "completed": 0, "failed": 0, "fallback_local": 0}
+
+    @property
+    def workers(self) -> int:
+        return len(self._conns)
+
+    def start(self, workers: int) -> None:
+        if self._conns:
+            return
+        # spawn: дочерний процесс не наследует event loop и соединения родителя
+        ctx = multiprocessing.get_context("spawn")
+        loop = asyncio.get_running_loop()
+        for index in range(workers):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_child_main, args=(child_conn, index), name=f"checker-{index}", daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._processes[index] = process
+            self._conns[index] = parent_conn
+            self._senders[index] = PipeSender(parent_conn)
+            self._ring.add(index)
+            loop.add_reader(parent_conn.fileno(), self._on_readable, index)
+        logger.info("Проверки выполняются в %d процессах", workers)
+
+    def _on_readable(self, index: int) -> None:
+        conn = self._conns.get(index)
+        if conn is None:
+            return
+        try:
+            job_id, outcome, error = conn.recv()
+        except (EOFError, OSError):
+            self._drop(index)
+            return
+        entry = self._pending.pop(job_id, None)
+        if entry is None or entry[1].done():
+            return
+        if error is not None:
+            entry[1].set_exception(RuntimeError(error))
+        else:
+            entry[1].set_result(outcome)
+
+    def _drop(self, index: int) -> None:
+        # Процесс завершился: его сайты переходят к соседям по кольцу,
+        # а незавершённые задания выполняются локально
+        conn = self._conns.pop(index, None)
+        self._senders.pop(index, None)
+        if conn is None:
+            return
+        asyncio.get_running_loop().remove_reader(conn.fileno())
+        conn.close()
+        self._ring.remove(index)
+        for job_id, (owner, future) in list(self._pending.items()):
+            if owner == index:
+                self._pending.pop(job_id)
+                if not future.done():
+                    future.set_exception(ConnectionError(f"процесс проверок {index} завершился"))
+        if not self._stopping:
+            logger.warning("Процесс проверок %d завершился, осталось %d", index, len(self._conns))
+
+    async def dispatch(
+        self, website: Website, fallback: Callable[..., Awaitable[dict]], timeout: Optional[float] = None
+    ) -> dict:
+        from app.tasks.remote import website_job
+
+        index = self._ring.node_for(website.id)
+        if index is not None:
+            self._next_job += 1
+            job_id = self._next_job
+            future = asyncio.get_running_loop().create_future()
+            self._pending[job_id] = (index, future)
+            self.stats["dispatched"] += 1
+            try:
+                await self._senders[index].send((job_id, website_job(website), timeout))
+                outcome = await future
+                self.stats["completed"] += 1
+                return outcome
+            except (ConnectionError, OSError):
+                self._pending.pop(job_id, None)
+            except RuntimeError:
+                self.stats["failed"] += 1
+                raise
+
+        self.stats["fallback_local"] += 1
+        return await fallback(website, timeout)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for sender in list(self._senders.values()):
+            try:
+                await sender.send(None)
+            except OSError:
+                pass
+        for index, process in self._processes.items():
+            await asyncio.to_thread(process.join, settings.http_timeout + 1)
+            if process.is_alive():
+                process.terminate()
+        for index in list(self._conns):
+            self._drop(index)
+        self._processes.clear()
+        self._stopping = False
+
+    def status(self) -> dict:
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for p in self._processes.values() if p.is_alive()),
+            "pending": len(self._pending),
+            **self.stats,
+        }
+
+
+process_executor = ProcessExecutor()
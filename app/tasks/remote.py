@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from app.config import settings
+from app.models.website import Website
+from app.nats import client as nats_client
+from app.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+def website_job(website: Website) -> dict:
+    protocol = website.protocol
+    return {
+        "id": website.id,
+        "name": website.name,
+        "url": website.url,
+        "protocol": getattr(protocol, "value", protocol),
+    }
+
+
+class NoWorkersError(Exception):
+    pass
+
+
+class JobDispatcher:
+    # Раздача заданий воркерам через NATS queue group с арендой.
+    # Воркер сразу подтверждает задание и дальше шлёт heartbeat — каждое
+    # сообщение продлевает аренду. Если подтверждения или heartbeat нет
+    # (воркер упал посреди проверки), задание отправляется повторно и
+    # достаётся другому воркеру. Ответы по истёкшей аренде отбрасываются.
+    def __init__(self) -> None:
+        self._connection = None
+        self._prefix: Optional[str] = None
+        self._waiters: dict[str, asyncio.Queue] = {}
+        self._inbox_lock = asyncio.Lock()
+        self._no_workers_until = 0.0
+        self.stats = {
+            "dispatched": 0,
+            "completed": 0,
+            "redelivered": 0,
+            "fallback_local": 0,
+        }
+
+    async def _ensure_inbox(self, connection) -> None:
+        # Одна подписка на все ответы: <inbox>.<token>. Под блокировкой, чтобы
+        # одновременные dispatch после (пере)подключения не создали по своей
+        if self._connection is connection:
+            return
+        async with self._inbox_lock:
+            if self._connection is connection:
+                return
+            prefix = connection.new_inbox()
+            await connection.subscribe(f"{prefix}.*", cb=self._on_reply)
+            self._prefix, self._connection = prefix, connection
+
+    async def _on_reply(self, msg) -> None:
+        queue = self._waiters.get(msg.subject.rsplit(".", 1)[1])
+        if queue is None:
+            return
+        if not msg.data and (msg.headers or {}).get("Status") == "503":
+            # Сервер сообщает, что в queue group нет ни одного воркера
+            queue.put_nowait({"status": "no_responders"})
+            return
+        queue.put_nowait(loads(msg.data))
+
+    async def _attempt(self, connection, job: dict) -> Optional[dict]:
+        token = uuid.uuid4().hex
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiters[token] = queue
+        try:
+            await connection.publish(
+                settings.nats_jobs_subject,
+                dumps(job),
+                reply=f"{self._prefix}.{token}",
+            )
+            timeout = settings.job_ack_timeout
+            while True:
+                reply = await asyncio.wait_for(queue.get(), timeout=timeout)
+                if reply.get("status") == "done":
+                    return reply["outcome"]
+                if reply.get("status") == "no_responders":
+                    raise NoWorkersError
+                # accepted / heartbeat — воркер жив, продлеваем аренду
+                timeout = settings.job_lease_seconds
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters.pop(token, None)
+
+    async def dispatch(
+        self, website: Website, fallback: Callable[..., Awaitable[dict]], timeout: Optional[float] = None
+    ) -> dict:
+        job = {"job_id": uuid.uuid4().hex, "website": website_job(website), "timeout": timeout}
+        connection = nats_client.connection
+        if nats_client.is_connected and connection is not None and time.monotonic() >= self._no_workers_until:
+            await self._ensure_inbox(connection)
+            for attempt in range(1, settings.job_max_attempts + 1):
+                job["attempt"] = attempt
+                self.stats["dispatched"] += 1
+                try:
+                    outcome = await self._attempt(connection, job)
+                except NoWorkersError:
+                    self._no_workers_until = time.monotonic() + settings.job_ack_timeout * 10
+                    break
+                if outcome is not None:
+                    self.stats["completed"] += 1
+                    return outcome
+                self.stats["redelivered"] += 1
+                logger.warning(
+                    "Задание %s (%s): аренда истекла, попытка %d", job["job_id"], website.name, attempt,
+                    extra={"website_id": website.id, "job_id": job["job_id"]},
+                )
+                if not nats_client.is_connected:
+                    break
+            else:
+                # Ни один воркер не взял задание — какое-то время проверяем сами
+                self._no_workers_until = time.monotonic() + settings.job_ack_timeout * 10
+
+        self.stats["fallback_local"] += 1
+        return await fallback(website, timeout)
+
+
+job_dispatcher = JobDispatcher()
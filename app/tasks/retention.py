@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, literal_column, select, text
+
+from app.config import settings
+from app.db.archive import archive_available, write_partition
+from app.db.history import iter_history
+from app.db.rollups import DAY, HOUR, MINUTE, bucket_start
+from app.db.session import engine
+from app.models.check_result import CheckResult
+from app.models.rollup import CheckRollup
+
+# При запуске через -m __name__ == "__main__", поэтому имя задаём явно
+logger = logging.getLogger("app.tasks.retention")
+
+_retention_task: Optional[asyncio.Task] = None
+last_run: dict = {}
+
+
+async def _prune(table, where, batch_size: int) -> int:
+    # Удаляем небольшими порциями в отдельных транзакциях,
+    # чтобы не держать блокировку записи и не мешать writer'у проверок
+    rowid = literal_column("rowid")
+    total = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                delete(table).where(
+                    rowid.in_(select(rowid).select_from(table).where(where).limit(batch_size))
+                )
+            )
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+        await asyncio.sleep(settings.retention_pause)
+
+
+async def _autocommit(*statements: str):
+    # Несколько прагм подряд на одном соединении, вне транзакции
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for sql in statements:
+            result = await conn.execute(text(sql))
+        return result.fetchall() if result.returns_rows else None
+
+
+async def _incremental_vacuum(pages: int) -> None:
+    # incremental_vacuum освобождает по странице за шаг; execute() делает
+    # только первый шаг, а executescript выполняет прагму целиком
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({pages})")
+
+
+async def incremental_vacuum_enabled() -> bool:
+    return (await _autocommit("PRAGMA auto_vacuum"))[0][0] == 2
+
+
+async def convert_to_incremental_vacuum() -> None:
+    # Полный VACUUM держит блокировку записи на всю базу, поэтому это
+    # отдельный шаг при остановленном сервисе, а не часть запуска
+    if await incremental_vacuum_enabled():
+        logger.info("База уже в режиме auto_vacuum=INCREMENTAL")
+        return
+    logger.info("Перевод базы в режим auto_vacuum=INCREMENTAL (полный VACUUM)...")
+    # Режим действует только для VACUUM на том же соединении
+    await _autocommit("PRAGMA auto_vacuum=INCREMENTAL", "VACUUM")
+    logger.info("Готово")
+
+
+async def archive_closed_days(now: datetime) -> dict:
+    # Законченные дни переносятся в Parquet по одному (день, сайт):
+    # файл пишется целиком, и только потом строки удаляются из SQLite
+    table = CheckResult.__table__
+    cutoff = bucket_start(now - timedelta(days=settings.archive_after_days), DAY)
+    day = func.date(table.c.checked_at)
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(table.c.website_id, day)
+            .where(table.c.checked_at < cutoff)
+            .group_by(table.c.website_id, day)
+            .order_by(day, table.c.website_id)
+        )
+        partitions = result.all()
+
+    archived = {"partitions": 0, "rows": 0}
+    for website_id, day_value in partitions:
+        day_start = datetime.fromisoformat(day_value)
+        day_end = day_start + timedelta(days=1)
+        rows, _ = await write_partition(
+            day_start.date(), website_id, iter_history(website_id, day_start, day_end)
+        )
+        await _prune(
+            table,
+            (table.c.website_id == website_id)
+            & (table.c.checked_at >= day_start)
+            & (table.c.checked_at < day_end),
+            settings.retention_batch_size,
+        )
+        archived["partitions"] += 1
+        archived["rows"] += rows
+    return archived
+
+
+async def run_retention() -> dict:
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    batch = settings.retention_batch_size
+    pruned = {}
+    archived = None
+
+    if archive_available():
+        # Сырые проверки уходят из базы только через архив
+        archived = await archive_closed_days(now)
+    elif settings.retention_raw_days > 0:
+        cutoff = now - timedelta(days=settings.retention_raw_days)
+        pruned["check_results"] = await _prune(
+            CheckResult.__table__, CheckResult.__table__.c.checked_at < cutoff, batch
+        )
+        if pruned["check_results"]:
+            logger.info(
+                "Удалено %d сырых проверок старше %s (RETENTION_RAW_DAYS=%d)",
+                pruned["check_results"], cutoff.isoformat(timespec="seconds"), settings.retention_raw_days,
+            )
+
+    # Старые детальные агрегаты удаляем, более крупные остаются дольше
+    rollup_table = CheckRollup.__table__
+    for name, resolution, days in (
+        ("rollups_minute", MINUTE, settings.retention_minute_days),
+        ("rollups_hour", HOUR, settings.retention_hour_days),
+        ("rollups_day", DAY, settings.retention_day_days),
+    ):
+        if days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        pruned[name] = await _prune(
+            rollup_table,
+            (rollup_table.c.resolution == resolution) & (rollup_table.c.bucket_start < cutoff),
+            batch,
+        )
+
+    # Освобождаем место постепенно, а не полным VACUUM. Без режима
+    # INCREMENTAL свободные страницы просто переиспользуются SQLite
+    incremental = await incremental_vacuum_enabled()
+    free_pages = (await _autocommit("PRAGMA freelist_count"))[0][0]
+    if free_pages and incremental:
+        await _incremental_vacuum(settings.retention_vacuum_pages)
+    free_after = (await _autocommit("PRAGMA freelist_count"))[0][0]
+
+    last_run.clear()
+    last_run.update({
+        "finished_at": datetime.utcnow().isoformat(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "pruned": pruned,
+        "archived": archived,
+        "pages_reclaimed": free_pages - free_after,
+        "free_pages": free_after,
+        "auto_vacuum": "incremental" if incremental else "none",
+    })
+    if archived is not None:
+        logger.info("Архив: перенесено %d проверок (%d партиций)", archived["rows"], archived["partitions"])
+    logger.info(
+        "Очистка истории: освобождено страниц %d", free_pages - free_after,
+        extra={"pruned": pruned, "duration_ms": last_run["duration_ms"]},
+    )
+    return dict(last_run)
+
+
+async def retention_loop() -> None:
+    if settings.archive_enabled and not archive_available():
+        logger.warning("Архив Parquet отключён: пакет pyarrow не установлен (pip install pyarrow)")
+    try:
+        if not await incremental_vacuum_enabled():
+            logger.warning(
+                "База не в режиме auto_vacuum=INCREMENTAL: место после очистки не возвращается системе. "
+                "Остановите сервис и выполните python -m app.tasks.retention --convert-vacuum"
+            )
+    except Exception as e:
+        logger.error("Ошибка проверки режима auto_vacuum: %s", e)
+    if settings.retention_raw_days > 0 and not archive_available():
+        logger.warning(
+            "Сырые проверки старше %d дней будут удаляться без архива (RETENTION_RAW_DAYS=%d, 0 — хранить всегда)",
+            settings.retention_raw_days, settings.retention_raw_days,
+        )
+    while True:
+        try:
+            await run_retention()
+        except Exception as e:
+            logger.exception("Ошибка очистки истории: %s", e)
+        await asyncio.sleep(settings.retention_interval)
+
+
+def start_retention() -> str:
+    global _retention_task
+    if _retention_task and not _retention_task.done():
+        return "Очистка истории уже запущена"
+    _retention_task = asyncio.get_event_loop().create_task(retention_loop())
+    return "Очистка истории запущена"
+
+
+async def stop_retention() -> None:
+    global _retention_task
+    if _retention_task and not _retention_task.done():
+        _retention_task.cancel()
+        try:
+            await _retention_task
+        except asyncio.CancelledError:
+            pass
+    _retention_task = None
+
+
+async def _convert() -> None:
+    try:
+        await convert_to_incremental_vacuum()
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обслуживание базы мониторинга")
+    parser.add_argument(
+        "--convert-vacuum", action="store_true",
+        help="перевести базу в auto_vacuum=INCREMENTAL (полный VACUUM, сервис должен быть остановлен)",
+    )
+    args = parser.parse_args()
+    if not args.convert_vacuum:
+        parser.print_help()
+        return
+    from app.log import setup_logging, stop_logging
+    setup_logging()
+    try:
+        asyncio.run(_convert())
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
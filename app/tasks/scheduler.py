@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+from sqlmodel import select
+
+from app import metrics
+from app.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.website import Website
+
+logger = logging.getLogger(__name__)
+
+
+class SiteScheduler:
+    # Планировщик проверок: куча (время следующей проверки, поколение, id сайта).
+    # Изменённые и удалённые сайты не ищутся в куче — их старые записи
+    # просто отбрасываются по несовпадению поколения.
+    def __init__(self) -> None:
+        self._sites: dict[int, Website] = {}
+        self._generation: dict[int, int] = {}
+        self._heap: list[tuple[float, int, int]] = []
+        self._in_flight: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self.running = False
+
+    def __len__(self) -> int:
+        return len(self._sites)
+
+    def _interval(self, website: Website) -> float:
+        return max(float(website.check_interval or 60), settings.check_min_interval)
+
+    def _push(self, website_id: int, due: float) -> None:
+        heapq.heappush(self._heap, (due, self._generation[website_id], website_id))
+        self._wakeup.set()
+
+    def upsert(self, website: Website, spread: bool = False) -> None:
+        if not website.is_active:
+            self.remove(website.id)
+            return
+        interval = self._interval(website)
+        self._sites[website.id] = website
+        self._generation[website.id] = self._generation.get(website.id, 0) + 1
+        # При старте разносим сайты по всему интервалу, иначе — небольшой сдвиг
+        if spread:
+            offset = random.uniform(0, interval)
+        else:
+            offset = random.uniform(0, interval * settings.check_jitter)
+        self._push(website.id, time.monotonic() + offset)
+
+    def remove(self, website_id: int) -> None:
+        self._sites.pop(website_id, None)
+        self._generation.pop(website_id, None)
+
+    async def load(self) -> None:
+        # Одна выборка активных сайтов при запуске; дальше изменения приходят из роутов
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Website).where(Website.is_active == True)
+            )
+            websites = result.scalars().all()
+        self._sites.clear()
+        self._generation.clear()
+        self._heap.clear()
+        for website in websites:
+            self.upsert(website, spread=True)
+        logger.info("Планировщик: %d сайтов в расписании", len(websites))
+
+    def _launch(self, website: Website, check: Callable[[Website], Awaitable]) -> None:
+        self._in_flight.add(website.id)
+
+        async def runner() -> None:
+            try:
+                await check(website)
+            except Exception as e:
+                logger.error("Ошибка проверки сайта %s: %s", website.name, e, extra={"website_id": website.id})
+            finally:
+                self._in_flight.discard(website.id)
+
+        task = asyncio.create_task(runner())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, check: Callable[[Website], Awaitable]) -> None:
+        self.running = True
+        try:
+            while True:
+                if not self._heap:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                due, generation, website_id = self._heap[0]
+                if self._generation.get(website_id) != generation:
+                    heapq.heappop(self._heap)
+                    continue
+
+                delay = due - time.monotonic()
+                if delay > 0:
+                    # Ждём срока или изменения расписания
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                website = self._sites[website_id]
+                metrics.schedule_lag.observe(-delay)
+                # Предыдущая проверка ещё идёт — пропускаем этот запуск
+                if website_id not in self._in_flight:
+                    self._launch(website, check)
+
+                # Следующий срок считаем от запланированного, чтобы не накапливать дрейф
+                interval = self._interval(website)
+                now = time.monotonic()
+                next_due = due + interval
+                if next_due < now:
+                    next_due = now + random.uniform(0, interval * settings.check_jitter)
+                self._push(website_id, next_due)
+        finally:
+            self.running = False
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "scheduled_sites": len(self._sites),
+            "in_flight": len(self._in_flight),
+            "heap_size": len(self._heap),
+        }
+
+
+site_scheduler = SiteScheduler()
+
+metrics.scheduled_sites.set_function(lambda: len(site_scheduler))
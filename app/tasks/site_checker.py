@@ -1,117 +1,422 @@
 import asyncio
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from datetime import datetime, timedelta
 from typing import Optional
 import time
-import httpx
-import socket
+import logging
+import uuid
 from sqlmodel import select
-import ssl
+from urllib.parse import urlsplit
 
+from app import metrics
+from app.config import settings
 from app.db.session import AsyncSessionLocal
+from app.db.writer import result_writer
+from app.log import log_context
 from app.models.website import Website, ProtocolType
 from app.models.check_result import CheckResult
+from app.tasks import remote
+from app.tasks.process_pool import process_executor
+from app.tasks.dns_cache import dns_timer, resolve_timed
+from app.tasks.http_client import PhaseTimer, get_http_client
+from app.tasks.icmp import check_ping
+from app.tasks.scheduler import site_scheduler
+from app.tasks.status_board import status_board
+from app.tasks.transitions import snapshot_loop, transition_tracker
 from app.nats.client import publish_event
 from app.ws.manager import ws_manager
 
+logger = logging.getLogger(__name__)
+
 _bg_task: Optional[asyncio.Task] = None
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+class CheckLimiter:
+    # Ограничение параллельных проверок: общее и на каждый хост
+    def __init__(self, concurrency: int, per_host: int) -> None:
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self._global = asyncio.Semaphore(concurrency)
+        self._hosts: dict[str, list] = {}  # хост -> [семафор, число пользователей]
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        entry = self._hosts.setdefault(host, [asyncio.Semaphore(self.per_host), 0])
+        entry[1] += 1
+        try:
+            # Сначала ждём хост, чтобы не занимать общий слот впустую
+            async with entry[0]:
+                async with self._global:
+                    self.in_flight += 1
+                    try:
+                        yield
+                    finally:
+                        self.in_flight -= 1
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._hosts.pop(host, None)
+
+
+check_limiter = CheckLimiter(settings.check_concurrency, settings.check_per_host_limit)
+
+
+class ProbePolicy:
+    # Как проверять каждый сайт:
+    #  - таймаут по недавним задержкам (p95 * коэффициент, но не больше базового),
+    #    чтобы упавший сайт не держал слот весь HTTP_TIMEOUT;
+    #  - быстрый повтор с полным таймаутом перед тем, как признать сайт упавшим;
+    #  - после BREAKER_THRESHOLD подтверждённых падений подряд сайт проверяется
+    #    не каждый цикл, а с экспоненциально растущей паузой (circuit breaker).
+    def __init__(self) -> None:
+        self._sites: dict[int, dict] = {}
+        self.skipped = 0
+        self.retries = 0
 
+    def _state(self, website_id: int) -> dict:
+        state = self._sites.get(website_id)
+        if state is None:
+            state = self._sites[website_id] = {
+                "latencies": deque(maxlen=settings.adaptive_timeout_window),
+                "failures": 0,
+                "open_until": None,  # monotonic; None — breaker закрыт
+                "next_probe_at": None,  # то же для табло, в UTC
+            }
+        return state
+
+    def base_timeout(self, website: Website) -> float:
+        if website.protocol == ProtocolType.TCP:
+            return settings.tcp_timeout
+        if website.protocol == ProtocolType.PING:
+            return settings.ping_timeout
+        return settings.http_timeout
+
+    def timeout_for(self, website: Website) -> float:
+        base = self.base_timeout(website)
+        latencies = self._state(website.id)["latencies"]
+        if len(latencies) < settings.adaptive_timeout_min_samples:
+            return base
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        adaptive = p95 / 1000 * settings.adaptive_timeout_factor
+        return min(base, max(settings.adaptive_timeout_min, adaptive))
+
+    def should_probe(self, website_id: int) -> bool:
+        open_until = self._state(website_id)["open_until"]
+        if open_until is not None and time.monotonic() < open_until:
+            self.skipped += 1
+            return False
+        return True
+
+    def can_retry(self, website_id: int) -> bool:
+        # Повторяем только у сайтов, которые ещё не считаются упавшими
+        return self._state(website_id)["failures"] == 0
+
+    def record(self, website: Website, is_up: bool, latency: Optional[float]) -> None:
+        state = self._state(website.id)
+        if is_up:
+            if latency is not None:
+                state["latencies"].append(latency)
+            state["failures"] = 0
+            state["open_until"] = state["next_probe_at"] = None
+            return
+
+        state["failures"] += 1
+        excess = state["failures"] - settings.breaker_threshold
+        if excess >= 0:
+            interval = max(float(website.check_interval or 60), settings.check_min_interval)
+            pause = min(interval * 2 ** (excess + 1), settings.breaker_max_backoff)
+            state["open_until"] = time.monotonic() + pause
+            state["next_probe_at"] = datetime.utcnow() + timedelta(seconds=pause)
+
+    def forget(self, website_id: int) -> None:
+        self._sites.pop(website_id, None)
+
+    def describe(self, website: Website) -> dict:
+        state = self._state(website.id)
+        next_probe_at = state["next_probe_at"]
+        return {
+            "timeout_ms": round(self.timeout_for(website) * 1000),
+            "consecutive_failures": state["failures"],
+            "breaker": "open" if state["open_until"] is not None else "closed",
+            "next_probe_at": next_probe_at.isoformat() if next_probe_at else None,
+        }
 
-async def check_http(url: str) -> tuple[bool, Optional[int], float]:
-    start = time.perf_counter()
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._sites),
+            "open_breakers": sum(1 for s in self._sites.values() if s["open_until"] is not None),
+            "skipped_checks": self.skipped,
+            "confirm_retries": self.retries,
+        }
+
+
+probe_policy = ProbePolicy()
+
+metrics.checks_in_flight.set_function(lambda: check_limiter.in_flight)
+metrics.checks_skipped.set_function(lambda: probe_policy.skipped)
+
+
+async def check_http(url: str, timeout: Optional[float] = None) -> tuple[bool, Optional[int], float, dict]:
+    timer = PhaseTimer()
+    token = dns_timer.set(timer)
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url, follow_redirects=True)
-            latency = (time.perf_counter() - start) * 1000
-            return resp.status_code < 500, resp.status_code, latency
+        client = get_http_client()
+        resp = await client.get(
+            url, timeout=timeout or settings.http_timeout, extensions={"trace": timer.trace}
+        )
+        latency = (time.perf_counter() - timer.start) * 1000
+        return resp.status_code < 500, resp.status_code, latency, timer.as_dict()
     except Exception as e:
-        latency = (time.perf_counter() - start) * 1000
-        return False, None, latency
+        latency = (time.perf_counter() - timer.start) * 1000
+        return False, None, latency, timer.as_dict()
+    finally:
+        dns_timer.reset(token)
 
 
-async def check_tcp(host: str, port: int = 80) -> tuple[bool, Optional[int], float]:
-    start = time.perf_counter()
+async def check_tcp(host: str, port: int = 80, timeout: Optional[float] = None) -> tuple[bool, Optional[int], float, dict]:
+    timer = PhaseTimer()
+    token = dns_timer.set(timer)
+
+    async def connect() -> bool:
+        # Адрес берём из общего кэша DNS и пробуем по порядку
+        for address in await resolve_timed(host):
+            try:
+                reader, writer = await asyncio.open_connection(address, port)
+            except OSError:
+                continue
+            writer.close()
+            await writer.wait_closed()
+            return True
+        return False
+
     try:
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_connection(host, port),
-            timeout=5
-        )
-        writer.close()
-        await writer.wait_closed()
-        latency = (time.perf_counter() - start) * 1000
-        return True, None, latency
+        is_up = await asyncio.wait_for(connect(), timeout=timeout or settings.tcp_timeout)
     except Exception:
-        latency = (time.perf_counter() - start) * 1000
-        return False, None, latency
+        is_up = False
+    finally:
+        dns_timer.reset(token)
+    latency = (time.perf_counter() - timer.start) * 1000
+    # Для TCP вся проверка, кроме резолва, и есть установка соединения
+    timer.connect_time = latency
+    return is_up, None, latency, timer.as_dict()
+
+
+def parse_tcp_target(url: str) -> tuple[str, int]:
+    # Извлекаем хост и порт из URL
+    host = url.replace("tcp://", "").split(":")[0]
+    port = int(url.split(":")[-1]) if ":" in url.replace("tcp://", "") else 80
+    return host, port
+
+
+def parse_ping_target(url: str) -> str:
+    # Для PING в url хранится имя хоста, допускаем и вид ping://host
+    return urlsplit(url).hostname if "://" in url else url.strip("/")
+
 
+def host_key(website: Website) -> str:
+    # Ключ для ограничения проверок на один хост
+    if website.protocol == ProtocolType.TCP:
+        return parse_tcp_target(website.url)[0]
+    if website.protocol == ProtocolType.PING:
+        return parse_ping_target(website.url)
+    return urlsplit(website.url).hostname or website.url
+
+
+async def probe_website(website: Website, timeout: Optional[float] = None) -> dict:
+    # Возвращает поля для CheckResult
+    outcome = {
+        "is_up": False,
+        "status_code": None,
+        "response_time": 0.0,
+        "error_message": None,
+    }
+
+    if website.protocol in [ProtocolType.HTTP, ProtocolType.HTTPS]:
+        is_up, status_code, response_time, phases = await check_http(website.url, timeout)
+        outcome.update(phases)
+    elif website.protocol == ProtocolType.TCP:
+        host, port = parse_tcp_target(website.url)
+        is_up, status_code, response_time, phases = await check_tcp(host, port, timeout)
+        outcome.update(phases)
+    elif website.protocol == ProtocolType.PING:
+        is_up, status_code, response_time, phases = await check_ping(parse_ping_target(website.url), timeout)
+        outcome.update(phases)
+    else:
+        return outcome
+
+    outcome.update(is_up=is_up, status_code=status_code, response_time=response_time)
+    return outcome
+
+
+async def execute_probe(website: Website, timeout: Optional[float] = None) -> dict:
+    if settings.check_executor == "nats":
+        return await remote.job_dispatcher.dispatch(website, probe_website, timeout)
+    if settings.check_executor == "processes":
+        return await process_executor.dispatch(website, probe_website, timeout)
+    return await probe_website(website, timeout)
+
+
+def probe_slot(website: Website):
+    # Удалённую проверку выполняет воркер под своими лимитами; локальный слот
+    # здесь только простаивал бы всё время ожидания ответа
+    if settings.check_executor == "nats":
+        return nullcontext()
+    return check_limiter.slot(host_key(website))
+
+
+async def check_website(website: Website, cycle: Optional[dict] = None, force: bool = False) -> Optional[CheckResult]:
+    # Сайт с открытым breaker ждёт своей очереди по backoff
+    if not force and not probe_policy.should_probe(website.id):
+        return None
+
+    retried = False
+    async with probe_slot(website):
+        if cycle is not None:
+            cycle["in_flight"] += 1
+            cycle["peak"] = max(cycle["peak"], cycle["in_flight"])
+        try:
+            probe_started = time.perf_counter()
+            outcome = await execute_probe(website, probe_policy.timeout_for(website))
+            if not outcome["is_up"] and probe_policy.can_retry(website.id):
+                # Подтверждаем падение повтором с полным таймаутом
+                probe_policy.retries += 1
+                await asyncio.sleep(settings.confirm_retry_delay)
+                outcome = await execute_probe(website, probe_policy.base_timeout(website))
+                retried = True
+        finally:
+            if cycle is not None:
+                cycle["in_flight"] -= 1
+    protocol = getattr(website.protocol, "value", website.protocol)
+    metrics.check_duration.labels(protocol, "up" if outcome["is_up"] else "down").observe(
+        time.perf_counter() - probe_started
+    )
+    # Строка на каждую проверку: только на DEBUG и с ограничением частоты
+    logger.debug(
+        "Проверка %s: %s за %.1f мс", website.name, "up" if outcome["is_up"] else "down",
+        outcome["response_time"], extra={"website_id": website.id, "protocol": protocol, "retried": retried},
+    )
+    probe_policy.record(website, outcome["is_up"], outcome["response_time"])
+
+    # Результат записываем и рассылаем сразу по завершении проверки
+    check = CheckResult(website_id=website.id, **outcome)
+    await result_writer.add(check)
+
+    previous = status_board.get(website.id)
+    events = transition_tracker.observe(website, check, previous["is_up"] if previous else None)
+    status_board.update(website, check, {**probe_policy.describe(website), "retried": retried})
+
+    for event in events:
+        await publish_event(event) or await ws_manager.broadcast_json(event)
+
+    # В режиме transitions поток по каждой проверке получают только подписавшиеся явно
+    if settings.event_mode == "full" or ws_manager.has_subscribers("check.completed", website.id):
+        await ws_manager.broadcast_json({
+            "type": "check.completed",
+            "payload": {
+                "website_id": website.id,
+                "website_name": website.name,
+                "is_up": check.is_up,
+                "response_time": check.response_time,
+                "ttfb": check.ttfb,
+                "checked_at": check.checked_at.isoformat()
+            }
+        })
+    return check
+
+
+async def run_check_cycle() -> dict:
+    # Разовая проверка всех активных сайтов (ручной запуск)
+    started = time.perf_counter()
+    cycle = {"in_flight": 0, "peak": 0}
+    cycle_id = uuid.uuid4().hex[:12]
 
-async def run_check_cycle():
     async with AsyncSessionLocal() as session:
         result = await session.execute(
             select(Website).where(Website.is_active == True)
         )
         websites = result.scalars().all()
-        
-        for website in websites:
-            try:
-                is_up = False
-                status_code = None
-                response_time = 0.0
-                error_msg = None
-                
-                if website.protocol in [ProtocolType.HTTP, ProtocolType.HTTPS]:
-                    is_up, status_code, response_time = await check_http(website.url)
-                elif website.protocol == ProtocolType.TCP:
-                    # Извлекаем хост и порт из URL
-                    host = website.url.replace("tcp://", "").split(":")[0]
-                    port = int(website.url.split(":")[-1]) if ":" in website.url else 80
-                    is_up, _, response_time = await check_tcp(host, port)
-                
-                check = CheckResult(
-                    website_id=website.id,
-                    is_up=is_up,
-                    status_code=status_code,
-                    response_time=response_time,
-                    error_message=error_msg
-                )
-                session.add(check)
-                
-                # Отправляем в WebSocket
-                await ws_manager.broadcast_json({
-                    "type": "check.completed",
-                    "payload": {
-                        "website_id": website.id,
-                        "website_name": website.name,
-                        "is_up": is_up,
-                        "response_time": response_time,
-                        "checked_at": check.checked_at.isoformat()
-                    }
-                })
-                
-            except Exception as e:
-                print(f"Error checking website {website.name}: {e}")
-                continue
-        
-        await session.commit()
-        
-        event = {
-            "type": "check.cycle.completed", 
-            "payload": {"websites_checked": len(websites)}
-        }
-        await publish_event(event) or await ws_manager.broadcast_json(event)
+
+    # cycle_id попадает во все записи лога проверок этого цикла
+    with log_context(cycle_id=cycle_id):
+        results = await asyncio.gather(
+            *(check_website(website, cycle, force=True) for website in websites), return_exceptions=True
+        )
+        for website, res in zip(websites, results):
+            if isinstance(res, Exception):
+                logger.error("Ошибка проверки сайта %s: %s", website.name, res, extra={"website_id": website.id})
+
+    metrics.cycle_duration.observe(time.perf_counter() - started)
+    stats = {
+        "cycle_id": cycle_id,
+        "websites_checked": len(websites),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "max_parallel": cycle["peak"],
+        "concurrency_limit": check_limiter.concurrency,
+        "per_host_limit": check_limiter.per_host,
+    }
+    logger.info(
+        "Цикл проверки: %d сайтов за %s мс, параллельно до %d",
+        stats["websites_checked"], stats["duration_ms"], stats["max_parallel"], extra={"cycle_id": cycle_id},
+    )
+
+    event = {
+        "type": "check.cycle.completed",
+        "payload": stats
+    }
+    await publish_event(event) or await ws_manager.broadcast_json(event)
+    return stats
 
 
 async def checker_loop():
+    # Каждый сайт проверяется по своему check_interval
     while True:
         try:
-            await run_check_cycle()
+            await site_scheduler.load()
+            await site_scheduler.run(check_website)
         except Exception as e:
-            print(f"Checker error: {e}")
-        await asyncio.sleep(60)  # Проверяем в написанный интервал времени
+            logger.exception("Ошибка фоновой проверки: %s", e)
+            await asyncio.sleep(5)
 
 
 def start_background_checker() -> str:
-    global _bg_task
+    global _bg_task, _snapshot_task
     loop = asyncio.get_event_loop()
     if _bg_task and not _bg_task.done():
         return "Фоновая проверка уже запущена"
     _bg_task = loop.create_task(checker_loop())
-    return "Фоновая проверка сайтов запущена"
\ No newline at end of file
+    if settings.event_mode == "transitions":
+        _snapshot_task = loop.create_task(snapshot_loop(ws_manager.broadcast_json))
+    return "Фоновая проверка сайтов запущена"
+
+
+async def stop_background_checker() -> None:
+    global _bg_task, _snapshot_task
+    for task in (_bg_task, _snapshot_task):
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _bg_task = None
+    _snapshot_task = None
+
+
+if __name__ == "__main__":
+    # python -m app.tasks.site_checker --workers N — API с проверками в N процессах
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Мониторинг с проверками в нескольких процессах")
+    parser.add_argument("--workers", type=int, default=settings.check_workers)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    settings.check_executor = "processes"
+    settings.check_workers = args.workers
+    uvicorn.run("app.main:app", host=args.host, port=args.port, log_level="info")
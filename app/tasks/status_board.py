@@ -0,0 +1,125 @@
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import select
+
+from app.db.session import AsyncSessionLocal
+from app.models.check_result import CheckResult
+from app.models.website import Website
+from app.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+class StatusBoard:
+    # Последнее состояние каждого сайта в памяти процесса.
+    # JSON каждой записи кодируется при обновлении, поэтому ответ
+    # /monitoring/board — это только склейка готовых фрагментов.
+    def __init__(self) -> None:
+        self._entries: dict[int, dict] = {}
+        self._encoded: dict[int, bytes] = {}
+        self._body: Optional[bytes] = None
+        self.updated_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, entry: dict) -> None:
+        self._entries[entry["website_id"]] = entry
+        self._encoded[entry["website_id"]] = dumps(entry)
+        self._body = None
+        self.updated_at = time.time()
+
+    def track(self, website: Website) -> None:
+        # Новый или изменённый сайт: обновляем название, состояние не трогаем
+        entry = self._entries.get(website.id)
+        if entry is None:
+            entry = {
+                "website_id": website.id,
+                "is_up": None,
+                "status_code": None,
+                "response_time": None,
+                "checked_at": None,
+                "last_change_at": None,
+                "streak": 0,
+            }
+        entry = {**entry, "website_name": website.name, "url": website.url}
+        self._store(entry)
+
+    def update(self, website: Website, check: CheckResult, probe: Optional[dict] = None) -> dict:
+        entry = self._entries.get(website.id)
+        checked_at = _iso(check.checked_at)
+        if entry is None or entry["is_up"] != check.is_up:
+            last_change_at, streak = checked_at, 1
+        else:
+            last_change_at, streak = entry["last_change_at"], entry["streak"] + 1
+
+        new_entry = {
+            "website_id": website.id,
+            "website_name": website.name,
+            "url": website.url,
+            "is_up": check.is_up,
+            "status_code": check.status_code,
+            "response_time": check.response_time,
+            "checked_at": checked_at,
+            "last_change_at": last_change_at,
+            "streak": streak,
+        }
+        if probe is not None:
+            # Таймаут, повтор и состояние circuit breaker из ProbePolicy
+            new_entry["probe"] = probe
+        self._store(new_entry)
+        return new_entry
+
+    def remove(self, website_id: int) -> None:
+        if self._entries.pop(website_id, None) is not None:
+            self._encoded.pop(website_id, None)
+            self._body = None
+
+    def get(self, website_id: int) -> Optional[dict]:
+        return self._entries.get(website_id)
+
+    async def warm(self) -> None:
+        # Один запрос: все сайты и последняя проверка каждого (поиск по индексу
+        # website_id, checked_at). Длину серии при прогреве не восстанавливаем.
+        latest_id = (
+            select(CheckResult.id)
+            .where(CheckResult.website_id == Website.id)
+            .order_by(CheckResult.checked_at.desc())
+            .limit(1)
+            .correlate(Website)
+            .scalar_subquery()
+        )
+        stmt = select(Website, CheckResult).outerjoin(CheckResult, CheckResult.id == latest_id)
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(stmt)
+            rows = result.all()
+
+        # Прогрев идёт параллельно с первыми проверками: их свежие
+        # записи не перетираем
+        for website, check in rows:
+            if website.id in self._entries:
+                continue
+            self.track(website)
+            if check is not None:
+                entry = self.update(website, check)
+                # Момент последней смены состояния до перезапуска неизвестен
+                self._store({**entry, "last_change_at": None})
+        logger.info("Табло состояния: загружено %d сайтов", len(rows))
+
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = (
+                b'{"count":' + str(len(self._encoded)).encode()
+                + b',"websites":[' + b",".join(self._encoded.values()) + b"]}"
+            )
+        return self._body
+
+
+status_board = StatusBoard()
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from app.config import settings
+from app.models.check_result import CheckResult
+from app.models.website import Website
+
+
+class TransitionTracker:
+    # Состояние сайтов для событий-переходов. Состояние меняется только
+    # после N подряд неудачных/успешных проверок, чтобы "моргающий"
+    # сайт не генерировал поток site.down/site.up.
+    def __init__(self, down_after: int, up_after: int, degraded_factor: float) -> None:
+        self.down_after = down_after
+        self.up_after = up_after
+        self.degraded_factor = degraded_factor
+        self._states: dict[int, dict] = {}
+        self._changed: dict[int, tuple] = {}  # изменения с последнего снимка
+
+    def _state(self, website_id: int, prior_up: Optional[bool]) -> dict:
+        state = self._states.get(website_id)
+        if state is None:
+            state = self._states[website_id] = {
+                "up": prior_up,  # None — состояние ещё неизвестно
+                "fail_streak": 0,
+                "ok_streak": 0,
+                "baseline": None,  # EWMA задержки успешных проверок
+                "samples": 0,
+                "degraded": False,
+            }
+        return state
+
+    def observe(self, website: Website, check: CheckResult, prior_up: Optional[bool] = None) -> list[dict]:
+        state = self._state(website.id, prior_up)
+        events = []
+        base = {
+            "website_id": website.id,
+            "website_name": website.name,
+            "response_time": check.response_time,
+            "at": check.checked_at.isoformat(),
+        }
+
+        if check.is_up:
+            state["ok_streak"] += 1
+            state["fail_streak"] = 0
+        else:
+            state["fail_streak"] += 1
+            state["ok_streak"] = 0
+
+        if state["up"] is not False and state["fail_streak"] >= self.down_after:
+            # Из неизвестного состояния тоже сообщаем о падении
+            state["up"] = False
+            state["degraded"] = False
+            events.append({"type": "site.down", "payload": {**base, "failures": state["fail_streak"]}})
+        elif state["up"] is not True and state["ok_streak"] >= self.up_after:
+            # Первый успешный запуск после старта — без события
+            if state["up"] is False:
+                events.append({"type": "site.up", "payload": {**base, "successes": state["ok_streak"]}})
+            state["up"] = True
+
+        latency = check.response_time
+        if check.is_up and latency is not None:
+            baseline = state["baseline"]
+            if baseline is not None and state["samples"] >= 5:
+                threshold = baseline * self.degraded_factor
+                if not state["degraded"] and latency > threshold:
+                    state["degraded"] = True
+                    events.append({"type": "latency.degraded", "payload": {**base, "baseline": round(baseline, 2)}})
+                elif state["degraded"] and latency < threshold * 0.8:
+                    state["degraded"] = False
+                    events.append({"type": "latency.recovered", "payload": {**base, "baseline": round(baseline, 2)}})
+            if not state["degraded"]:
+                # Базовую задержку учим только на нормальных проверках
+                state["baseline"] = latency if baseline is None else baseline * 0.9 + latency * 0.1
+                state["samples"] += 1
+
+        self._changed[website.id] = (
+            1 if state["up"] else 0 if state["up"] is False else None,
+            round(latency, 1) if latency is not None else None,
+            int(state["degraded"]),
+        )
+        return events
+
+    def forget(self, website_id: int) -> None:
+        self._states.pop(website_id, None)
+        self._changed.pop(website_id, None)
+
+    def take_snapshot(self) -> Optional[dict]:
+        # Компактная дельта по столбцам: сайты, проверенные с прошлого снимка
+        if not self._changed:
+            return None
+        changed, self._changed = self._changed, {}
+        ids = list(changed)
+        return {
+            "type": "status.snapshot",
+            "payload": {
+                "at": datetime.utcnow().isoformat(),
+                "ids": ids,
+                "up": [changed[i][0] for i in ids],
+                "rt": [changed[i][1] for i in ids],
+                "degraded": [changed[i][2] for i in ids],
+            },
+        }
+
+
+transition_tracker = TransitionTracker(
+    down_after=settings.flap_down_after,
+    up_after=settings.flap_up_after,
+    degraded_factor=settings.latency_degraded_factor,
+)
+
+
+async def snapshot_loop(broadcast) -> None:
+    while True:
+        await asyncio.sleep(settings.snapshot_interval)
+        snapshot = transition_tracker.take_snapshot()
+        if snapshot is not None:
+            await broadcast(snapshot)
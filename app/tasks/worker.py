@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+
+import nats
+
+from app.config import settings
+from app.log import log_context, setup_logging, stop_logging
+from app.models.website import Website
+from app.serialization import dumps, loads
+from app.tasks.http_client import close_http_client, start_http_client
+from app.tasks.site_checker import CheckLimiter, host_key, probe_website
+
+# Отдельный процесс-воркер: берёт задания проверки из NATS queue group,
+# выполняет check_http/check_tcp и отвечает результатом. Планирование
+# и запись результатов остаются в процессе API.
+#
+#   python -m app.tasks.worker [--concurrency N]
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# При запуске через -m __name__ == "__main__", поэтому имя задаём явно
+logger = logging.getLogger("app.tasks.worker")
+
+limiter = CheckLimiter(settings.check_concurrency, settings.check_per_host_limit)
+
+
+async def handle_job(nc, msg) -> None:
+    job = loads(msg.data)
+    website = Website(**job["website"])
+
+    async def reply(body: dict) -> None:
+        await nc.publish(msg.reply, dumps({"job_id": job["job_id"], "worker": WORKER_ID, **body}))
+
+    # Подтверждаем задание и, пока оно в очереди или выполняется, продлеваем аренду
+    await reply({"status": "accepted"})
+
+    async def heartbeat() -> None:
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            await reply({"status": "heartbeat"})
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        with log_context(website_id=website.id, job_id=job["job_id"]):
+            async with limiter.slot(host_key(website)):
+                outcome = await probe_website(website, job.get("timeout"))
+            logger.debug("Задание выполнено: %s", "up" if outcome["is_up"] else "down")
+    finally:
+        beat.cancel()
+    await reply({"status": "done", "outcome": outcome})
+
+
+async def run_worker() -> None:
+    await start_http_client()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    nc = await nats.connect(
+        settings.nats_url,
+        connect_timeout=2,
+        allow_reconnect=True,
+        max_reconnect_attempts=-1,
+        reconnect_time_wait=settings.nats_reconnect_wait,
+    )
+    tasks: set[asyncio.Task] = set()
+
+    async def on_job(msg) -> None:
+        # Колбэк NATS вызывается последовательно — проверку запускаем отдельно
+        task = asyncio.create_task(handle_job(nc, msg))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    sub = await nc.subscribe(settings.nats_jobs_subject, queue=settings.nats_queue_group, cb=on_job)
+    logger.info("Воркер %s слушает %s (группа %s)", WORKER_ID, settings.nats_jobs_subject, settings.nats_queue_group)
+
+    await stop.wait()
+    logger.info("Воркер %s останавливается, в работе %d проверок", WORKER_ID, len(tasks))
+    # Новые задания не берём, текущие доделываем и отвечаем, потом закрываемся
+    await sub.unsubscribe()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await nc.drain()
+    await close_http_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воркер проверок сайтов (NATS)")
+    parser.add_argument("--concurrency", type=int, default=settings.check_concurrency)
+    args = parser.parse_args()
+    global limiter
+    limiter = CheckLimiter(args.concurrency, settings.check_per_host_limit)
+    setup_logging()
+    try:
+        asyncio.run(run_worker())
+    finally:
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,272 @@
-from typing import List
+import asyncio
+import logging
+from typing import List, Optional
 from fastapi import WebSocket
-from fastapi.encoders import jsonable_encoder
+
+from app import metrics
+from app.config import settings
+from app.serialization import dumps_str
+
+logger = logging.getLogger(__name__)
+
+
+class WSClient:
+    # Подключение с собственной очередью исходящих сообщений и задачей отправки
+    def __init__(self, ws: WebSocket, queue_size: int) -> None:
+        self.ws = ws
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.closing = False
+        # По умолчанию клиент получает все события, как раньше
+        self.types: set[str] = {"*"}
+        self.sites: set[int] = set()  # пусто — все сайты
+        self.default_types = True
+
+
+def _type_prefixes(event_type: str) -> list[str]:
+    # "check.completed" -> ["*", "check.*"]: шаблоны, которые покрывают тип
+    parts = event_type.split(".")
+    return ["*"] + [".".join(parts[:i]) + ".*" for i in range(1, len(parts))]
+
+
+def _event_site(data) -> Optional[int]:
+    # id сайта, к которому относится событие (если есть)
+    if not isinstance(data, dict):
+        return None
+    payload = data.get("payload")
+    if data.get("type") == "nats.inbound" and isinstance(payload, dict):
+        return _event_site(payload)
+    if not isinstance(payload, dict):
+        return None
+    site = payload.get("website_id")
+    if site is None and str(data.get("type", "")).startswith("website."):
+        site = payload.get("id")
+    return site
 
 
 class WSManager:
-    def __init__(self) -> None:
-        self.active: List[WebSocket] = []
+    def __init__(self, queue_size: int, slow_policy: str, send_timeout: float, opt_in_types: set[str]) -> None:
+        self.clients: dict[WebSocket, WSClient] = {}
+        # Типы, которые не покрываются шаблонами "*" и "x.*" — только явная подписка
+        self.opt_in_types = opt_in_types
+        # Индексы подписок: шаблон типа -> клиенты, id сайта -> клиенты
+        self._by_type: dict[str, set[WSClient]] = {}
+        self._by_site: dict[int, set[WSClient]] = {}
+        self._all_sites: set[WSClient] = set()
+        self.queue_size = queue_size
+        self.slow_policy = slow_policy  # drop_oldest | drop_new | disconnect
+        self.send_timeout = send_timeout
+        self._outbox: asyncio.Queue = asyncio.Queue(maxsize=10000)
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.broadcasts = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+    @property
+    def active(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, ws: WebSocket) -> None:
         await ws.accept()
-        self.active.append(ws)
+        client = WSClient(ws, self.queue_size)
+        client.sender = asyncio.create_task(self._sender(client))
+        self.clients[ws] = client
+        self._index(client)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
 
     async def disconnect(self, ws: WebSocket) -> None:
+        client = self.clients.pop(ws, None)
+        if client is not None:
+            self._unindex(client)
+            if client.sender is not asyncio.current_task():
+                client.sender.cancel()
         try:
             await ws.close()
         except Exception:
             pass
-        if ws in self.active:
-            self.active.remove(ws)
+
+    def _index(self, client: WSClient) -> None:
+        for pattern in client.types:
+            self._by_type.setdefault(pattern, set()).add(client)
+        if client.sites:
+            for site in client.sites:
+                self._by_site.setdefault(site, set()).add(client)
+        else:
+            self._all_sites.add(client)
+
+    def _unindex(self, client: WSClient) -> None:
+        for pattern in client.types:
+            clients = self._by_type.get(pattern)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self._by_type[pattern]
+        for site in client.sites:
+            clients = self._by_site.get(site)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self._by_site[site]
+        self._all_sites.discard(client)
+
+    def subscribe(self, ws: WebSocket, event_type: Optional[str] = None, site: Optional[int] = None) -> Optional[dict]:
+        client = self.clients.get(ws)
+        if client is None:
+            return None
+        self._unindex(client)
+        if event_type is not None:
+            # Первая явная подписка заменяет подписку "на всё" по умолчанию
+            if client.default_types:
+                client.types = set()
+                client.default_types = False
+            client.types.add(event_type)
+        if site is not None:
+            client.sites.add(site)
+        self._index(client)
+        return self.subscriptions(ws)
+
+    def unsubscribe(self, ws: WebSocket, event_type: Optional[str] = None, site: Optional[int] = None) -> Optional[dict]:
+        client = self.clients.get(ws)
+        if client is None:
+            return None
+        self._unindex(client)
+        if event_type is not None:
+            client.types.discard(event_type)
+            client.default_types = False
+        if site is not None:
+            client.sites.discard(site)
+        self._index(client)
+        return self.subscriptions(ws)
+
+    def subscriptions(self, ws: WebSocket) -> Optional[dict]:
+        client = self.clients.get(ws)
+        if client is None:
+            return None
+        return {"events": sorted(client.types), "websites": sorted(client.sites)}
+
+    def _targets(self, event_type: str, site: Optional[int]) -> set[WSClient]:
+        targets = set(self._by_type.get(event_type, ()))
+        if event_type not in self.opt_in_types:
+            for pattern in _type_prefixes(event_type):
+                targets.update(self._by_type.get(pattern, ()))
+        return self._filter_site(targets, site)
+
+    def _filter_site(self, targets: set[WSClient], site: Optional[int]) -> set[WSClient]:
+        if site is None or not targets:
+            return targets
+        return targets & (self._all_sites | self._by_site.get(site, set()))
+
+    def has_subscribers(self, event_type: str, site: Optional[int] = None) -> bool:
+        return bool(self._targets(event_type, site))
 
     async def broadcast_json(self, data) -> None:
-        to_remove = []
-        for ws in list(self.active):
+        # Для вызывающего — только постановка в очередь; кодирование и
+        # раздача клиентам выполняются в отдельной задаче
+        if not self.clients:
+            return
+        try:
+            self._outbox.put_nowait(data)
+        except asyncio.QueueFull:
+            self._outbox.get_nowait()
+            self._outbox.put_nowait(data)
+            self.dropped += 1
+
+    async def send_json(self, ws: WebSocket, data) -> None:
+        # Личное сообщение одному клиенту через его очередь
+        client = self.clients.get(ws)
+        if client is not None:
+            self._offer(client, dumps_str(data))
+
+    def _offer(self, client: WSClient, text: str) -> None:
+        if client.closing:
+            return
+        try:
+            client.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        # Клиент не успевает читать
+        client.dropped += 1
+        self.dropped += 1
+        if self.slow_policy == "disconnect":
+            client.closing = True
+            self.slow_disconnects += 1
+            asyncio.create_task(self.disconnect(client.ws))
+        elif self.slow_policy == "drop_oldest":
+            client.queue.get_nowait()
+            client.queue.put_nowait(text)
+
+    async def _dispatch(self) -> None:
+        while True:
+            data = await self._outbox.get()
+            event_type = data.get("type", "") if isinstance(data, dict) else ""
+            site = _event_site(data)
+            payload = data.get("payload") if isinstance(data, dict) else None
+            if event_type == "nats.inbound" and isinstance(payload, dict) and payload.get("type"):
+                # Событие, вернувшееся через NATS, подбираем по его собственному типу;
+                # обёртку целиком получают только явно подписанные на nats.inbound
+                targets = self._targets(str(payload["type"]), site)
+                targets |= self._filter_site(set(self._by_type.get("nats.inbound", ())), site)
+            else:
+                targets = self._targets(str(event_type), site)
+            if not targets:
+                # Никто не подписан — даже не кодируем
+                continue
             try:
-                await ws.send_json(jsonable_encoder(data))
-            except Exception:
-                to_remove.append(ws)
-        for ws in to_remove:
-            await self.disconnect(ws)
+                # Кодируем один раз на рассылку
+                text = dumps_str(data)
+            except Exception as e:
+                logger.error("Ошибка кодирования WebSocket сообщения: %s", e, extra={"event_type": event_type})
+                continue
+            self.broadcasts += 1
+            for client in targets:
+                self._offer(client, text)
+            # Даём задачам отправки разобрать очереди между рассылками
+            await asyncio.sleep(0)
+
+    async def _sender(self, client: WSClient) -> None:
+        try:
+            while True:
+                text = await client.queue.get()
+                await asyncio.wait_for(client.ws.send_text(text), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Ошибка или зависшая отправка — отключаем клиента
+            await self.disconnect(client.ws)
+
+    def client_queues(self) -> list[tuple[tuple[str], int]]:
+        # Глубина очереди каждого клиента для /metrics
+        return [
+            ((f"{ws.client.host}:{ws.client.port}" if ws.client else str(id(ws)),), client.queue.qsize())
+            for ws, client in self.clients.items()
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self.clients),
+            "queue_size": self.queue_size,
+            "slow_policy": self.slow_policy,
+            "pending_broadcasts": self._outbox.qsize(),
+            "broadcasts": self.broadcasts,
+            "subscription_patterns": len(self._by_type),
+            "site_filters": len(self._by_site),
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+            "max_client_queue": max((c.queue.qsize() for c in self.clients.values()), default=0),
+        }
+
 
+ws_manager = WSManager(
+    queue_size=settings.ws_queue_size,
+    slow_policy=settings.ws_slow_policy,
+    send_timeout=settings.ws_send_timeout,
+    opt_in_types={"check.completed"} if settings.event_mode == "transitions" else set(),
+)
 
-ws_manager = WSManager()
\ No newline at end of file
+metrics.ws_connections.set_function(lambda: len(ws_manager.clients))
+metrics.ws_client_queue.set_function(ws_manager.client_queues)
+metrics.ws_dropped.set_function(lambda: ws_manager.dropped)
@@ -1,5 +1,6 @@
 import asyncio
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.config import settings
 from app.ws.manager import ws_manager
 
 router = APIRouter()
@@ -10,7 +11,7 @@ async def ws_monitoring(ws: WebSocket):
     await ws_manager.connect(ws)
     
     # Отправляем приветственное сообщение
-    await ws.send_json({
+    await ws_manager.send_json(ws, {
         "type": "welcome",
         "message": "Подключено к системе мониторинга сайтов",
         "supported_events": [
@@ -19,20 +20,25 @@ async def ws_monitoring(ws: WebSocket):
             "website.deleted",
             "check.completed",
             "check.cycle.completed",
+            "site.down",
+            "site.up",
+            "latency.degraded",
+            "latency.recovered",
+            "status.snapshot",
             "nats.inbound"
-        ]
+        ],
+        "event_mode": settings.event_mode,
+        "subscribe": "subscribe:<event | prefix.* | *>, subscribe:site:<id>, unsubscribe:..."
     })
     
     async def send_heartbeat():
-        while True:
+        # Клиент мог быть отключён менеджером как медленный
+        while ws in ws_manager.clients:
             await asyncio.sleep(30)
-            try:
-                await ws.send_json({
-                    "type": "heartbeat",
-                    "timestamp": asyncio.get_event_loop().time()
-                })
-            except:
-                break
+            await ws_manager.send_json(ws, {
+                "type": "heartbeat",
+                "timestamp": asyncio.get_event_loop().time()
+            })
     
     heartbeat_task = asyncio.create_task(send_heartbeat())
     
@@ -42,23 +48,40 @@ async def ws_monitoring(ws: WebSocket):
                 data = await ws.receive_text()
                 
                 if data == "Кто ты воин?":
-                    await ws.send_json({"type": "Я Ахилес, сын Пелея", "timestamp": asyncio.get_event_loop().time()})
-                elif data.startswith("subscribe:"):
-                    # Простая система подписки на события
-                    event_type = data.split(":")[1]
-                    await ws.send_json({
+                    await ws_manager.send_json(ws, {"type": "Я Ахилес, сын Пелея", "timestamp": asyncio.get_event_loop().time()})
+                elif data.startswith(("subscribe:", "unsubscribe:")):
+                    # subscribe:<тип | шаблон.* | *>, subscribe:site:<id>, unsubscribe:...
+                    action, _, target = data.partition(":")
+                    handler = ws_manager.subscribe if action == "subscribe" else ws_manager.unsubscribe
+                    if target.startswith("site:"):
+                        try:
+                            site = int(target.split(":", 1)[1])
+                        except ValueError:
+                            await ws_manager.send_json(ws, {"type": "error", "message": f"Некорректный id сайта: {target}"})
+                            continue
+                        current = handler(ws, site=site)
+                    else:
+                        current = handler(ws, event_type=target)
+                    await ws_manager.send_json(ws, {
+                        "type": "subscription",
+                        "event": target,
+                        "status": "subscribed" if action == "subscribe" else "unsubscribed",
+                        "subscriptions": current
+                    })
+                elif data == "subscriptions":
+                    await ws_manager.send_json(ws, {
                         "type": "subscription",
-                        "event": event_type,
-                        "status": "subscribed"
+                        "subscriptions": ws_manager.subscriptions(ws)
                     })
                 else:
-                    await ws.send_json({
+                    await ws_manager.send_json(ws, {
                         "type": "echo",
                         "received": data,
                         "timestamp": asyncio.get_event_loop().time()
                     })
                     
-            except WebSocketDisconnect:
+            except (WebSocketDisconnect, RuntimeError):
+                # RuntimeError — сокет уже закрыт менеджером
                 break
     finally:
         heartbeat_task.cancel()
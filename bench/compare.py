@@ -0,0 +1,49 @@
+import argparse
+import json
+
+# Сравнение двух результатов bench.run: все числовые поля с изменением в процентах.
+#
+#   python -m bench.compare bench/results/old.json bench/results/new.json
+
+
+def flatten(data, prefix: str = "") -> dict:
+    values = {}
+    if isinstance(data, dict):
+        for key, value in data.items():
+            values.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(data, list):
+        for index, value in enumerate(data):
+            values.update(flatten(value, f"{prefix}{index}."))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        values[prefix.rstrip(".")] = data
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение результатов бенчмарка")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"base: {base['meta']['commit'][:8]} {base['meta']['subject']}")
+    print(f"new:  {new['meta']['commit'][:8]} {new['meta']['subject']}")
+    if base["meta"]["params"] != new["meta"]["params"]:
+        print("Внимание: параметры запусков отличаются")
+
+    old_values, new_values = flatten(base["results"]), flatten(new["results"])
+    width = max((len(key) for key in new_values), default=0)
+    for key, value in new_values.items():
+        old = old_values.get(key)
+        if old is None:
+            print(f"{key:<{width}}  {'':>12}  {value:>12}")
+            continue
+        change = f"{(value - old) * 100 / old:+.1f}%" if old else ""
+        print(f"{key:<{width}}  {old:>12}  {value:>12}  {change}")
+
+
+if __name__ == "__main__":
+    main()
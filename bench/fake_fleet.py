@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import random
+import signal
+from urllib.parse import parse_qs, urlsplit
+
+# Локальный «парк сайтов» для бенчмарка: один HTTP-сервер на asyncio
+# (keep-alive, без внешних пакетов) и несколько TCP-портов.
+#
+#   /ok/<n>     — 200 после базовой задержки (--latency ± --jitter, мс)
+#   /slow/<n>   — 200 после --slow-latency мс
+#   /flaky/<n>  — 500 с вероятностью --error-rate, иначе как /ok
+#   /error/<n>  — всегда 500
+#   /hang/<n>   — не отвечает, пока клиент не закроет соединение
+#   ?delay=<мс> — задержка для конкретного запроса
+#
+# TCP-порты --tcp-port ... --tcp-port + --tcp-ports - 1 принимают
+# соединение и сразу его закрывают.
+#
+#   python -m bench.fake_fleet --port 18500 --tcp-port 18600 --tcp-ports 50
+
+
+class FakeFleet:
+    def __init__(self, latency: float, jitter: float, slow_latency: float, error_rate: float) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.requests = 0
+
+    def _plan(self, target: str) -> tuple[int, float]:
+        # (код ответа, задержка в секундах); код 0 — зависнуть
+        parts = urlsplit(target)
+        kind = parts.path.strip("/").split("/", 1)[0]
+        delay = max(self.latency + random.uniform(-self.jitter, self.jitter), 0.0)
+        query = parse_qs(parts.query)
+        if "delay" in query:
+            delay = float(query["delay"][0])
+        if kind == "hang":
+            return 0, 0.0
+        if kind == "slow":
+            return 200, self.slow_latency / 1000
+        if kind == "error":
+            return 500, delay / 1000
+        if kind == "flaky" and random.random() < self.error_rate:
+            return 500, delay / 1000
+        return 200, delay / 1000
+
+    async def handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                self.requests += 1
+                method, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+                status, delay = self._plan(target)
+                if status == 0:
+                    # Держим соединение, пока клиент не сдастся
+                    await reader.read()
+                    return
+                if delay:
+                    await asyncio.sleep(delay)
+                body = b"" if method == "HEAD" else b"ok"
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\n\r\n%s"
+                    % (status, b"OK" if status == 200 else b"Error", len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.close()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    fleet = FakeFleet(args.latency, args.jitter, args.slow_latency, args.error_rate)
+    servers = [await asyncio.start_server(fleet.handle_http, args.host, args.port, backlog=4096)]
+    for port in range(args.tcp_port, args.tcp_port + args.tcp_ports):
+        servers.append(await asyncio.start_server(fleet.handle_tcp, args.host, port, backlog=1024))
+    print(f"fake fleet: http://{args.host}:{args.port}, tcp {args.tcp_port}..{args.tcp_port + args.tcp_ports - 1}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    for server in servers:
+        server.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Локальные фейковые сайты для бенчмарка")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18500)
+    parser.add_argument("--tcp-port", type=int, default=18600)
+    parser.add_argument("--tcp-ports", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=20, help="базовая задержка ответа, мс")
+    parser.add_argument("--jitter", type=float, default=10, help="разброс задержки, мс")
+    parser.add_argument("--slow-latency", type=float, default=1500, help="задержка /slow, мс")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="доля ошибок /flaky")
+    return parser
+
+
+def main() -> None:
+    asyncio.run(serve(build_parser().parse_args()))
+
+
+if __name__ == "__main__":
+    main()
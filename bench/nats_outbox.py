@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+# Проверка publisher'а NATS и outbox на локальном nats-server:
+#   offline  — сервер не запущен, события копятся в outbox процесса;
+#   restart  — новый процесс с тем же outbox подключается и сразу публикует
+#              новые события: сохранённые должны прийти раньше них;
+#   outage   — сервер останавливается и поднимается посреди публикации.
+# Подписчик собирает номера событий и проверяет потери, дубли и порядок.
+#
+#   python -m bench.nats_outbox [--nats-server PATH] [--port 14222]
+
+ROOT = Path(__file__).resolve().parent.parent
+SUBJECT = "bench.outbox"
+
+
+async def publish_range(start: int, count: int, rate: float, settle: float) -> None:
+    # Запускается в отдельном процессе: настройки приложения берутся из окружения
+    from app.config import settings
+    from app.nats import client
+
+    # Как при старте приложения: проверки публикуют события, не дожидаясь
+    # конца connect_nats — сразу, как только появилось соединение
+    connecting = asyncio.create_task(client.connect_nats())
+    deadline = time.monotonic() + settings.nats_connect_wait
+    while not client.is_connected and not connecting.done() and time.monotonic() < deadline:
+        await asyncio.sleep(0)
+    for seq in range(start, start + count):
+        await client.publish_event({"type": "bench.seq", "payload": {"seq": seq}})
+        if rate:
+            await asyncio.sleep(1 / rate)
+    # Ждём, пока буфер и outbox уйдут в NATS (если он доступен)
+    deadline = time.monotonic() + settle
+    while time.monotonic() < deadline:
+        if client.is_connected and client.publisher.outbox.depth == 0 and not client.publisher._buffer:
+            break
+        await asyncio.sleep(0.05)
+    depth = client.publisher.outbox.depth
+    await connecting
+    await client.close_nats()
+    print(f"published {start}..{start + count - 1}, outbox depth {depth}", flush=True)
+
+
+def run_phase(env: dict, start: int, count: int, rate: float = 0, settle: float = 10) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "bench.nats_outbox", "--phase",
+            "--start", str(start), "--count", str(count), "--rate", str(rate), "--settle", str(settle),
+        ],
+        cwd=env["BENCH_WORKDIR"], env=env,
+    )
+
+
+class Collector:
+    def __init__(self) -> None:
+        self.seqs: list[int] = []
+
+    async def on_message(self, msg) -> None:
+        from app.serialization import loads
+
+        body = msg.data
+        if (msg.headers or {}).get("Content-Encoding") == "deflate":
+            body = zlib.decompress(body)
+        data = loads(body)
+        events = data["batch"] if isinstance(data, dict) and "batch" in data else [data]
+        self.seqs.extend(event["payload"]["seq"] for event in events)
+
+    def report(self, expected: range) -> dict:
+        seen = set(self.seqs)
+        return {
+            "received": len(self.seqs),
+            "missing": len(set(expected) - seen),
+            "duplicates": len(self.seqs) - len(seen),
+            "out_of_order": sum(1 for a, b in zip(self.seqs, self.seqs[1:]) if b < a),
+        }
+
+
+async def _quiet(e) -> None:
+    # Ошибки переподключения подписчика во время остановки сервера ожидаемы
+    pass
+
+
+def start_server(binary: str, port: int, workdir: Path) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [binary, "-p", str(port), "-a", "127.0.0.1"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    time.sleep(0.5)
+    return server
+
+
+async def run_checks(args: argparse.Namespace) -> bool:
+    import nats
+
+    workdir = Path(tempfile.mkdtemp(prefix="nats-outbox-"))
+    url = f"nats://127.0.0.1:{args.port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        "BENCH_WORKDIR": str(workdir),
+        "NATS_URL": url,
+        "NATS_SUBJECT": SUBJECT,
+        "NATS_OUTBOX_PATH": str(workdir / "outbox.db"),
+        "NATS_CONNECT_WAIT": "2",
+        "NATS_RECONNECT_WAIT": "1",
+        "NATS_COMPRESSION": "1",
+        "LOG_LEVEL": "WARNING",
+    }
+    ok = True
+    server = None
+    try:
+        # 1. Сервера нет: всё уходит в outbox
+        await asyncio.to_thread(run_phase(env, 0, 500, settle=0).wait)
+
+        # 2. Новый процесс, сервер доступен: сначала хвост outbox, потом новые
+        server = start_server(args.nats_server, args.port, workdir)
+        collector = Collector()
+        nc = await nats.connect(url, reconnect_time_wait=0.1, max_reconnect_attempts=-1, error_cb=_quiet)
+        await nc.subscribe(SUBJECT, cb=collector.on_message)
+        await nc.flush()
+        await asyncio.to_thread(run_phase(env, 500, 500).wait)
+        await asyncio.sleep(0.5)
+        result = collector.report(range(0, 1000))
+        print("restart:", result)
+        ok &= result["missing"] == 0 and result["out_of_order"] == 0
+
+        # 3. Сервер падает и поднимается посреди публикации
+        collector.seqs.clear()
+        phase = run_phase(env, 1000, 1000, rate=500, settle=15)
+        await asyncio.sleep(0.7)
+        server.terminate()
+        server.wait()
+        await asyncio.sleep(1.0)
+        server = start_server(args.nats_server, args.port, workdir)
+        await asyncio.to_thread(phase.wait)
+        await asyncio.sleep(0.5)
+        result = collector.report(range(1000, 2000))
+        print("outage:", result)
+        # При обрыве посреди пачки порядок не гарантируется, только отсутствие потерь
+        ok &= result["missing"] == 0
+        await nc.close()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка NATS publisher и outbox на локальном nats-server")
+    parser.add_argument("--nats-server", default=shutil.which("nats-server") or "nats-server")
+    parser.add_argument("--port", type=int, default=14222)
+    # Внутренний режим: один процесс-публикатор
+    parser.add_argument("--phase", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--start", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--rate", type=float, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--settle", type=float, default=10, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.phase:
+        asyncio.run(publish_range(args.start, args.count, args.rate, args.settle))
+        return
+    sys.exit(0 if asyncio.run(run_checks(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+import websockets
+
+# Бенчмарк проверок, API, WebSocket и записи в базу на одной машине без сети:
+# фейковые сайты (bench.fake_fleet) и API (uvicorn) запускаются отдельными
+# процессами во временном каталоге со своей monitoring.db, база заполняется
+# N сайтами, указывающими на фейковый парк. Результат — JSON в bench/results,
+# два файла сравниваются через python -m bench.compare.
+#
+#   python -m bench.run --sites 2000 --cycles 3 --ws-clients 50
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Доли видов сайтов в парке (tcp — на TCP-порты фейкового парка)
+DEFAULT_MIX = "ok=0.80,slow=0.05,flaky=0.05,error=0.03,hang=0.02,tcp=0.05"
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(int(q * len(ordered)), len(ordered) - 1)], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for item in spec.split(","):
+        kind, _, share = item.partition("=")
+        mix.append((kind.strip(), float(share)))
+    return mix
+
+
+def git_info() -> dict:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def seed_database(workdir: Path, args: argparse.Namespace) -> dict:
+    # Схема и сайты пишутся напрямую через синхронный движок до запуска API,
+    # поэтому приложение не загружает демо-данные
+    from sqlalchemy import create_engine, insert
+
+    from app.db.migrations import ensure_schema
+    from app.models.check_result import CheckResult
+    from app.models.website import ProtocolType, Website
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    base = f"http://127.0.0.1:{args.fleet_port}"
+    kinds = [kind for kind, share in parse_mix(args.mix) for _ in range(round(share * 1000))]
+
+    websites = []
+    tcp_ports = 0
+    for i in range(args.sites):
+        kind = rng.choice(kinds)
+        if kind == "tcp":
+            # URL сайта уникален, поэтому у каждого TCP-сайта свой порт
+            url, protocol = f"tcp://127.0.0.1:{args.tcp_port + tcp_ports}", ProtocolType.TCP
+            tcp_ports += 1
+        else:
+            url, protocol = f"{base}/{kind}/{i}", ProtocolType.HTTP
+        websites.append({
+            "name": f"bench-{kind}-{i}",
+            "url": url,
+            "protocol": protocol,
+            "check_interval": args.check_interval,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    started = time.perf_counter()
+    engine = create_engine(f"sqlite:///{workdir / 'monitoring.db'}")
+    with engine.begin() as conn:
+        ensure_schema(conn)
+        conn.execute(insert(Website.__table__), websites)
+
+        # История для замеров /websites/{id}/checks
+        history = []
+        for website_id in range(1, min(args.history_sites, args.sites) + 1):
+            for n in range(args.history_rows):
+                history.append({
+                    "website_id": website_id,
+                    "checked_at": now - timedelta(minutes=n),
+                    "is_up": rng.random() > 0.05,
+                    "status_code": 200,
+                    "response_time": rng.uniform(5, 200),
+                })
+        for i in range(0, len(history), 10000):
+            conn.execute(insert(CheckResult.__table__), history[i:i + 10000])
+    engine.dispose()
+    return {
+        "websites": len(websites),
+        "tcp_ports": tcp_ports,
+        "history_rows": len(history),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def wait_port(port: int, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"порт {port} так и не открылся")
+
+
+def start_processes(workdir: Path, args: argparse.Namespace, tcp_ports: int) -> list[subprocess.Popen]:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(ROOT),
+        # NATS не нужен: события уходят в WebSocket напрямую
+        "NATS_URL": "nats://127.0.0.1:1",
+        "NATS_CONNECT_WAIT": "0.1",
+        "LOG_LEVEL": "WARNING",
+        "HTTP_TIMEOUT": str(args.timeout),
+        "TCP_TIMEOUT": str(args.timeout),
+        "CHECK_CONCURRENCY": str(args.concurrency),
+        # Все фейковые сайты на одном хосте — лимит на хост не должен их сериализовать
+        "CHECK_PER_HOST_LIMIT": str(args.concurrency),
+        "WS_QUEUE_SIZE": str(args.ws_queue_size),
+        "RETENTION_INTERVAL": "86400",
+        "ARCHIVE_ENABLED": "0",
+    }
+    fleet = subprocess.Popen(
+        [
+            sys.executable, "-m", "bench.fake_fleet",
+            "--port", str(args.fleet_port),
+            "--tcp-port", str(args.tcp_port),
+            "--tcp-ports", str(tcp_ports),
+            "--latency", str(args.latency),
+        ],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    log = open(workdir / "server.log", "wb")
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(args.api_port), "--log-level", "warning",
+        ],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return [fleet, server]
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return round((time.perf_counter() - started) * 1000, 1)
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("API не поднялся")
+
+
+async def bench_cycles(client: httpx.AsyncClient, cycles: int) -> dict:
+    # Ручной цикл проверяет все активные сайты и возвращает свою статистику
+    runs = []
+    for _ in range(cycles):
+        response = await client.post("/monitoring/run-check", timeout=None)
+        stats = response.json()["cycle"]
+        runs.append({
+            "duration_ms": stats["duration_ms"],
+            "websites": stats["websites_checked"],
+            "checks_per_sec": round(stats["websites_checked"] / (stats["duration_ms"] / 1000), 1),
+            "max_parallel": stats["max_parallel"],
+        })
+    return {"runs": runs, "best_checks_per_sec": max(r["checks_per_sec"] for r in runs)}
+
+
+async def bench_endpoint(client: httpx.AsyncClient, paths: list[str], requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    queue = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for n in queue:
+            started = time.perf_counter()
+            response = await client.get(paths[n % len(paths)])
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def bench_websocket(client: httpx.AsyncClient, args: argparse.Namespace) -> dict:
+    # M клиентов слушают поток check.completed во время одного цикла проверки.
+    # Задержка доставки — от checked_at результата до получения клиентом
+    url = f"ws://127.0.0.1:{args.api_port}/ws/monitoring"
+    latencies: list[float] = []
+    received = []
+    ready = asyncio.Event()
+    connected = 0
+
+    async def listen() -> None:
+        nonlocal connected
+        count = 0
+        async with websockets.connect(url, max_queue=None) as ws:
+            await ws.recv()  # welcome
+            connected += 1
+            if connected == args.ws_clients:
+                ready.set()
+            try:
+                while True:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), timeout=args.ws_idle_timeout))
+                    if message.get("type") == "check.completed":
+                        count += 1
+                        checked_at = datetime.fromisoformat(message["payload"]["checked_at"])
+                        latencies.append((datetime.utcnow() - checked_at).total_seconds() * 1000)
+                    elif message.get("type") == "check.cycle.completed":
+                        break
+            except asyncio.TimeoutError:
+                pass
+        received.append(count)
+
+    listeners = [asyncio.create_task(listen()) for _ in range(args.ws_clients)]
+    await asyncio.wait_for(ready.wait(), timeout=30)
+    before = (await client.get("/monitoring/status")).json()["websocket"]
+    started = time.perf_counter()
+    cycle = (await client.post("/monitoring/run-check", timeout=None)).json()["cycle"]
+    await asyncio.gather(*listeners)
+    elapsed = time.perf_counter() - started
+    after = (await client.get("/monitoring/status")).json()["websocket"]
+
+    expected = cycle["websites_checked"] * args.ws_clients
+    return {
+        "clients": args.ws_clients,
+        "messages_expected": expected,
+        "messages_received": sum(received),
+        "delivery_ratio": round(sum(received) / expected, 4) if expected else None,
+        "messages_per_sec": round(sum(received) / elapsed, 1),
+        "delivery_latency_ms": percentiles(latencies),
+        # Счётчики менеджера за время замера: отброшенные для медленных клиентов и т.п.
+        "server": {key: after[key] - before[key] for key in ("broadcasts", "dropped", "slow_disconnects")},
+    }
+
+
+async def writer_stats(client: httpx.AsyncClient) -> dict:
+    return (await client.get("/monitoring/status")).json()["writer"]
+
+
+async def drain_writer(client: httpx.AsyncClient, timeout: float = 30) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        stats = await writer_stats(client)
+        if stats["queue_depth"] == 0 or time.monotonic() > deadline:
+            return stats
+        await asyncio.sleep(0.2)
+
+
+def db_write_rate(before: dict, after: dict, elapsed: float) -> dict:
+    # Скорость самой записи — строки за время внутри flush, и общая — за время замера
+    rows = after["written"] - before["written"]
+    flushes = after["flushes"] - before["flushes"]
+    flush_ms = after["avg_flush_ms"] * after["flushes"] - before["avg_flush_ms"] * before["flushes"]
+    return {
+        "rows": rows,
+        "flushes": flushes,
+        "dropped": after["dropped"] - before["dropped"],
+        "rows_per_sec_wall": round(rows / elapsed, 1) if elapsed else None,
+        "rows_per_sec_flushing": round(rows / (flush_ms / 1000), 1) if flush_ms > 0 else None,
+        "avg_flush_ms": round(flush_ms / flushes, 2) if flushes else None,
+        "max_flush_ms": after["max_flush_ms"],
+    }
+
+
+async def run_benchmarks(args: argparse.Namespace) -> dict:
+    results: dict = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.api_port}", timeout=60) as client:
+        results["startup_ms"] = await wait_ready(client)
+
+        before = await writer_stats(client)
+        started = time.perf_counter()
+        results["check_cycle"] = await bench_cycles(client, args.cycles)
+        after = await drain_writer(client)
+        results["db_write"] = db_write_rate(before, after, time.perf_counter() - started)
+
+        ids = range(1, min(args.history_sites, args.sites) + 1)
+        results["api"] = {
+            "websites_list": await bench_endpoint(
+                client, ["/websites/"], args.api_requests // 10 or 1, args.api_concurrency
+            ),
+            "website_checks": await bench_endpoint(
+                client, [f"/websites/{i}/checks?limit=100" for i in ids], args.api_requests, args.api_concurrency
+            ),
+            "website_checks_deep_page": await bench_endpoint(
+                client,
+                [f"/websites/{i}/checks?limit=100&until={(datetime.utcnow() - timedelta(days=1)).isoformat()}" for i in ids],
+                args.api_requests, args.api_concurrency,
+            ),
+        }
+        if args.ws_clients:
+            results["websocket"] = await bench_websocket(client, args)
+    return results
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Бенчмарк мониторинга на локальном фейковом парке сайтов")
+    parser.add_argument("--sites", type=int, default=2000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли видов сайтов: ok, slow, flaky, error, hang, tcp")
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=200, help="CHECK_CONCURRENCY для API")
+    parser.add_argument("--timeout", type=float, default=2, help="HTTP_TIMEOUT/TCP_TIMEOUT проверок, с")
+    parser.add_argument("--latency", type=float, default=20, help="базовая задержка фейковых сайтов, мс")
+    parser.add_argument("--check-interval", type=int, default=86400,
+                        help="check_interval сайтов; большой, чтобы планировщик не мешал замерам")
+    parser.add_argument("--history-sites", type=int, default=50)
+    parser.add_argument("--history-rows", type=int, default=2000)
+    parser.add_argument("--api-requests", type=int, default=1000)
+    parser.add_argument("--api-concurrency", type=int, default=20)
+    parser.add_argument("--ws-clients", type=int, default=20)
+    parser.add_argument("--ws-queue-size", type=int, default=256)
+    parser.add_argument("--ws-idle-timeout", type=float, default=30)
+    parser.add_argument("--fleet-port", type=int, default=18500)
+    parser.add_argument("--tcp-port", type=int, default=18600)
+    parser.add_argument("--api-port", type=int, default=18400)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=str(ROOT / "bench" / "results"), help="каталог или файл .json")
+    parser.add_argument("--keep", action="store_true", help="не удалять рабочий каталог (база, server.log)")
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="monitoring-bench-"))
+    processes = []
+    try:
+        seeded = seed_database(workdir, args)
+        processes = start_processes(workdir, args, seeded["tcp_ports"])
+        wait_port(args.fleet_port)
+        results = asyncio.run(run_benchmarks(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"Рабочий каталог: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            **git_info(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("out", "keep")},
+        },
+        "seed": seeded,
+        "results": results,
+    }
+    out = Path(args.out)
+    if out.suffix != ".json":
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        out = out / f"{stamp}-{(report['meta']['commit'] or 'nogit')[:8]}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"Результаты: {out}")
+
+
+if __name__ == "__main__":
+    main()